@@ -1,62 +1,267 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import os
-from typing import Optional
-
-try:
-    from gpt4all import GPT4All
-except ImportError:
-    GPT4All = None
-
-app = FastAPI()
-
-MODEL_NAME = "mistral-7b-openorca.Q2_K.gguf"
-MODEL_PATH = "./models"
-MODEL_FILE = os.path.join(MODEL_PATH, MODEL_NAME)
-
-model: Optional[object] = None
-model_load_error: Optional[str] = None
-
-if GPT4All is None:
-    model_load_error = "gpt4all package is not installed. Please install it in your environment."
-elif not os.path.isdir(MODEL_PATH):
-    model_load_error = f"Model directory does not exist: {MODEL_PATH}"
-elif not os.path.isfile(MODEL_FILE):
-    model_load_error = f"Model file does not exist: {MODEL_FILE}"
-else:
-    try:
-        model = GPT4All(MODEL_NAME, model_path=MODEL_PATH, allow_download=False)
-    except Exception as e:
-        model_load_error = f"Failed to load model: {str(e)}"
-
-class QueryRequest(BaseModel):
-    user_query: str
-    retrieved_docs: list[str]
-
-@app.post("/generate/")
-async def generate_response(request: QueryRequest):
-    if model_load_error:
-        raise HTTPException(status_code=500, detail=f"Model not available: {model_load_error}")
-    if not request.retrieved_docs:
-        raise HTTPException(status_code=400, detail="No documents provided for context.")
-    try:
-        documents = "\n\n".join(doc.strip() for doc in request.retrieved_docs if doc.strip())
-        prompt = f"""
-You are a knowledgeable and concise financial assistant.
-Respond to the user's question using only the information provided in the retrieved documents.
-If the answer is not present in those documents, clearly respond with:
-\"I'm sorry, I couldn't find that information in the provided data.\"
-Keep your answers natural, well-structured, and easy to understand. Use full sentences and avoid listing raw data unless it's relevant to the user’s query.
-
-Documents:
-{documents}
-
-User Query:
-{request.user_query}
-
-Answer:
-"""
-        output = model.generate(prompt, max_tokens=300, temp=0.4)
-        return {"response": output.strip()}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+import asyncio
+import json
+import os
+from typing import Optional
+
+import http_client
+import telemetry
+from context_builder import CONTEXT_TOKEN_BUDGET, estimate_tokens, fit_documents
+from model_lifecycle import MODEL_WARMUP, LazyModel, add_lifecycle_routes
+from llm_scheduler import DeadlineExceeded, GenerationScheduler, JobCancelled, QueueFull
+from response_cache import RESPONSE_CACHE_SEMANTIC, RESPONSE_CACHE_TTL, ResponseCache, docs_key, response_key
+
+try:
+    from gpt4all import GPT4All
+except ImportError:
+    GPT4All = None
+
+app = FastAPI()
+telemetry.instrument(app, "llm")
+
+MODEL_NAME = "mistral-7b-openorca.Q2_K.gguf"
+MODEL_PATH = "./models"
+MODEL_FILE = os.path.join(MODEL_PATH, MODEL_NAME)
+RETRIEVER_AGENT_URL = "http://127.0.0.1:8004"
+
+model_load_error: Optional[str] = None
+
+if GPT4All is None:
+    model_load_error = "gpt4all package is not installed. Please install it in your environment."
+elif not os.path.isdir(MODEL_PATH):
+    model_load_error = f"Model directory does not exist: {MODEL_PATH}"
+elif not os.path.isfile(MODEL_FILE):
+    model_load_error = f"Model file does not exist: {MODEL_FILE}"
+
+
+def load_gpt4all():
+    if model_load_error:
+        raise RuntimeError(model_load_error)
+    return GPT4All(MODEL_NAME, model_path=MODEL_PATH, allow_download=False)
+
+
+model = LazyModel(MODEL_NAME, load_gpt4all, warmup=lambda m: m.generate("Hello", max_tokens=1))
+add_lifecycle_routes(app, model)
+
+
+def load_worker_model(worker_id: int):
+    """Model instance for one scheduler worker; the first worker shares the lazy model warmed up on startup."""
+    if worker_id == 0:
+        return model
+    return load_gpt4all()
+
+
+scheduler = GenerationScheduler(load_worker_model)
+response_cache = ResponseCache()
+telemetry.gauge("llm_queue_depth", "Generation jobs waiting for a worker.", lambda: scheduler.metrics()["queue_depth"])
+telemetry.gauge("llm_busy_workers", "Workers currently generating.", lambda: scheduler.metrics()["busy_workers"])
+telemetry.gauge("llm_response_cache_entries", "Cached LLM responses.", lambda: response_cache.stats()["entries"])
+
+
+@app.on_event("startup")
+async def startup():
+    if model_load_error is None:
+        scheduler.start(preload=MODEL_WARMUP)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    scheduler.stop()
+    await http_client.close_async_client()
+
+
+class QueryRequest(BaseModel):
+    user_query: str
+    retrieved_docs: list[str]
+    priority: int = 0
+    deadline_seconds: Optional[float] = None
+    max_age_seconds: Optional[float] = None  # freshness of the data in the documents; bounds answer caching
+
+MAX_TOKENS = 300
+TEMPERATURE = 0.4
+MODEL_CONTEXT_TOKENS = int(os.getenv("MODEL_CONTEXT_TOKENS", "2048"))  # GPT4All's default n_ctx
+CONTEXT_SAFETY_MARGIN = int(os.getenv("CONTEXT_SAFETY_MARGIN", "64"))  # slack for estimate_tokens' error
+
+PROMPT_TEMPLATE = """
+You are a knowledgeable and concise financial assistant.
+Respond to the user's question using only the information provided in the retrieved documents.
+If the answer is not present in those documents, clearly respond with:
+\"I'm sorry, I couldn't find that information in the provided data.\"
+Keep your answers natural, well-structured, and easy to understand. Use full sentences and avoid listing raw data unless it's relevant to the user’s query.
+
+Documents:
+{documents}
+
+User Query:
+{query}
+
+Answer:
+"""
+
+
+def build_prompt(request: QueryRequest) -> str:
+    documents = "\n\n".join(doc.strip() for doc in request.retrieved_docs if doc.strip())
+    return PROMPT_TEMPLATE.format(documents=documents, query=request.user_query)
+
+
+def document_budget(request: QueryRequest) -> int:
+    """Tokens left for documents once the template, question, answer and safety margin are reserved."""
+    reserved = estimate_tokens(PROMPT_TEMPLATE.format(documents="", query=request.user_query))
+    return max(0, min(CONTEXT_TOKEN_BUDGET, MODEL_CONTEXT_TOKENS - reserved - MAX_TOKENS - CONTEXT_SAFETY_MARGIN))
+
+
+def check_request(request: QueryRequest):
+    """Validates the request and trims its documents to the context token budget."""
+    if model_load_error:
+        raise HTTPException(status_code=500, detail=f"Model not available: {model_load_error}")
+    if model.state == "failed":
+        raise HTTPException(status_code=500, detail=f"Model not available: {model.error}")
+    if not request.retrieved_docs:
+        raise HTTPException(status_code=400, detail="No documents provided for context.")
+    request.retrieved_docs = fit_documents([doc.strip() for doc in request.retrieved_docs if doc.strip()], document_budget(request))
+
+
+def sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def submit(request: QueryRequest, on_token=None):
+    """Queues a generation, turning a full queue into 429 with a Retry-After hint."""
+    try:
+        return scheduler.submit(
+            build_prompt(request),
+            {"max_tokens": MAX_TOKENS, "temp": TEMPERATURE},
+            priority=request.priority,
+            deadline_seconds=request.deadline_seconds,
+            on_token=on_token,
+        )
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(int(e.retry_after + 0.5))})
+
+
+async def wait_for_job(job, http_request: Request):
+    """Awaits a queued job, cancelling it if the client goes away first."""
+    result = asyncio.wrap_future(job.future)
+    try:
+        while True:
+            done, _ = await asyncio.wait({result}, timeout=0.5)
+            if done:
+                return result.result()
+            if await http_request.is_disconnected():
+                job.cancel()
+    except asyncio.CancelledError:
+        job.cancel()
+        raise
+
+
+class CacheLookup:
+    """Response-cache key material for one request, plus the answer if one was cached."""
+
+    def __init__(self, request: QueryRequest):
+        self.key = response_key(f"{PROMPT_TEMPLATE}|{MAX_TOKENS}|{TEMPERATURE}", request.retrieved_docs, request.user_query)
+        self.docs_key = docs_key(request.retrieved_docs)
+        self.ttl = RESPONSE_CACHE_TTL if request.max_age_seconds is None else min(RESPONSE_CACHE_TTL, request.max_age_seconds)
+        self.vector = None
+        self.response = None
+
+    def store(self, response: str):
+        response_cache.put(self.key, response, self.ttl, self.docs_key, self.vector)
+
+
+async def embed_query(text: str):
+    """Query embedding from the retriever's MiniLM model, or None if the retriever is unavailable."""
+    try:
+        resp = await http_client.get_async_client().post(f"{RETRIEVER_AGENT_URL}/embed", json={"texts": [text]}, timeout=5.0)
+        resp.raise_for_status()
+        return resp.json()["embeddings"][0]
+    except Exception as e:
+        print(f"Semantic cache lookup skipped: {str(e)}")
+        return None
+
+
+async def lookup_cache(request: QueryRequest) -> CacheLookup:
+    lookup = CacheLookup(request)
+    lookup.response = response_cache.get(lookup.key)
+    if lookup.response is None and RESPONSE_CACHE_SEMANTIC and lookup.ttl > 0:
+        lookup.vector = await embed_query(request.user_query)
+        if lookup.vector is not None:
+            lookup.response = response_cache.get_similar(lookup.docs_key, lookup.vector)
+    return lookup
+
+
+@app.get("/scheduler_stats")
+async def scheduler_stats():
+    return scheduler.metrics()
+
+
+@app.get("/response_cache_stats")
+async def response_cache_stats():
+    return response_cache.stats()
+
+
+@app.post("/generate/")
+async def generate_response(request: QueryRequest, http_request: Request):
+    check_request(request)
+    cached = await lookup_cache(request)
+    if cached.response is not None:
+        return {"response": cached.response, "cached": True}
+    job = submit(request)
+    try:
+        output = await wait_for_job(job, http_request)
+        cached.store(output.strip())
+        return {"response": output.strip()}
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=f"Generation timed out: {str(e)}")
+    except JobCancelled as e:
+        raise HTTPException(status_code=499, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+
+
+@app.post("/generate/stream")
+async def generate_response_stream(request: QueryRequest, http_request: Request):
+    """Server-sent events: one ``{"token": ...}`` event per generated token, then ``{"done": true, "response": ...}``.
+
+    Generation is queued on the scheduler like /generate/ and is cancelled as soon as the client disconnects.
+    A cached answer is sent as a single token event.
+    """
+    check_request(request)
+    cached = await lookup_cache(request)
+    if cached.response is not None:
+        async def replay():
+            yield sse_event({"token": cached.response})
+            yield sse_event({"done": True, "response": cached.response, "cached": True})
+
+        return StreamingResponse(replay(), media_type="text/event-stream")
+    loop = asyncio.get_running_loop()
+    tokens = asyncio.Queue()
+    job = submit(request, on_token=lambda token: loop.call_soon_threadsafe(tokens.put_nowait, token))
+    result = asyncio.wrap_future(job.future)
+
+    async def events():
+        try:
+            while True:
+                next_token = asyncio.ensure_future(tokens.get())
+                done, _ = await asyncio.wait({next_token, result}, return_when=asyncio.FIRST_COMPLETED)
+                if next_token in done:
+                    yield sse_event({"token": next_token.result()})
+                    if await http_request.is_disconnected():
+                        return
+                    continue
+                next_token.cancel()
+                while not tokens.empty():
+                    yield sse_event({"token": tokens.get_nowait()})
+                try:
+                    output = result.result()
+                except Exception as e:
+                    yield sse_event({"error": f"Generation failed: {str(e)}"})
+                    return
+                cached.store(output.strip())
+                yield sse_event({"done": True, "response": output.strip()})
+                return
+        finally:
+            job.cancel()
+
+    return StreamingResponse(events(), media_type="text/event-stream")
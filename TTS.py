@@ -1,18 +1,79 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-import pyttsx3
-
-app = FastAPI()
-
-class TTSRequest(BaseModel):
-    text: str
-
-@app.post("/speak")
-def speak(req: TTSRequest):
-    # Create new engine instance for each request
-    engine = pyttsx3.init()
-    engine.setProperty('rate', 150)
-    engine.say(req.text)
-    engine.runAndWait()
-    engine.stop()
-    return {"message": f"Spoken: {req.text}"}
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+import asyncio
+import base64
+import json
+
+import telemetry
+from tts_worker import TTSWorker, concat_wavs
+
+app = FastAPI()
+telemetry.instrument(app, "tts")
+
+# One engine for the life of the process instead of pyttsx3.init() per request
+worker = TTSWorker()
+telemetry.gauge("tts_queue_depth", "Jobs waiting for the TTS engine thread.", lambda: worker.stats()["queue_depth"])
+telemetry.gauge("tts_cache_hits", "Synthesized sentences served from the audio cache.", lambda: worker.cache.hits)
+
+class TTSRequest(BaseModel):
+    text: str
+
+
+@app.on_event("startup")
+def startup_event():
+    worker.start()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    worker.stop()
+
+
+def sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@app.post("/speak")
+async def speak(req: TTSRequest):
+    """Queues the text for playback on this machine's speakers and returns without waiting for it."""
+    worker.speak(req.text)
+    return {"message": f"Queued for speech: {req.text}", "queue_depth": worker.stats()["queue_depth"]}
+
+
+@app.post("/synthesize")
+async def synthesize(req: TTSRequest):
+    """The whole text as one WAV file."""
+    jobs = worker.synthesize_text(req.text)
+    if not jobs:
+        raise HTTPException(status_code=400, detail="No text to synthesize.")
+    try:
+        chunks = [await asyncio.wrap_future(future) for _, future in jobs]
+        return Response(content=concat_wavs(chunks), media_type="audio/wav")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Synthesis failed: {str(e)}")
+
+
+@app.post("/synthesize/stream")
+async def synthesize_stream(req: TTSRequest):
+    """Server-sent events with one base64 WAV per sentence, sent as soon as each is synthesized."""
+    jobs = worker.synthesize_text(req.text)
+    if not jobs:
+        raise HTTPException(status_code=400, detail="No text to synthesize.")
+
+    async def events():
+        for index, (sentence, future) in enumerate(jobs):
+            try:
+                audio = await asyncio.wrap_future(future)
+            except Exception as e:
+                yield sse_event({"error": f"Synthesis failed: {str(e)}", "index": index})
+                return
+            yield sse_event({"index": index, "sentence": sentence, "audio": base64.b64encode(audio).decode("ascii")})
+        yield sse_event({"done": True, "sentences": len(jobs)})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/tts_stats")
+def tts_stats():
+    return worker.stats()
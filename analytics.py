@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+
+def close_matrix(bars: dict) -> pd.DataFrame:
+    """Aligns per-ticker column arrays (as returned by ``api_agent.load_bars``) into a dates x tickers close frame."""
+    series = {
+        ticker: pd.Series(cols["close"], index=pd.to_datetime(cols["date"].astype("datetime64[D]")))
+        for ticker, cols in bars.items() if len(cols["date"])
+    }
+    if not series:
+        return pd.DataFrame()
+    return pd.DataFrame(series).sort_index()
+
+
+def daily_returns(closes: pd.DataFrame) -> pd.DataFrame:
+    return closes.pct_change(fill_method=None)
+
+
+def rolling_volatility(returns: pd.DataFrame, window: int) -> pd.DataFrame:
+    """Annualised rolling standard deviation of daily returns."""
+    return returns.rolling(window, min_periods=window).std() * np.sqrt(TRADING_DAYS)
+
+
+def moving_average(closes: pd.DataFrame, window: int) -> pd.DataFrame:
+    return closes.rolling(window, min_periods=window).mean()
+
+
+def drawdown(closes: pd.DataFrame) -> pd.DataFrame:
+    """Fractional distance below the running peak (0 at a new high, negative below it)."""
+    return closes / closes.cummax() - 1
+
+
+def beta(returns: pd.DataFrame, benchmark_returns: pd.Series) -> pd.Series:
+    """Beta of every column against the benchmark, computed over the dates both have returns for."""
+    joined = returns.join(benchmark_returns.rename("__benchmark__"), how="inner")
+    bench = joined.pop("__benchmark__")
+    valid = joined.notna() & bench.notna().to_numpy()[:, None]
+    x = np.where(valid, joined.to_numpy(), np.nan)
+    b = np.where(valid, bench.to_numpy()[:, None], np.nan)
+    x_dev = x - np.nanmean(x, axis=0)
+    b_dev = b - np.nanmean(b, axis=0)
+    cov = np.nansum(x_dev * b_dev, axis=0)
+    var = np.nansum(b_dev * b_dev, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.Series(cov / var, index=joined.columns)
+
+
+def correlation(returns: pd.DataFrame) -> pd.DataFrame:
+    return returns.corr()
+
+
+def correlation_matrix(returns: pd.DataFrame, digits: int = 4) -> dict:
+    """Correlation as JSON-ready nested lists; undefined pairs (constant prices, too little overlap) are None."""
+    corr = correlation(returns)
+    return {
+        "tickers": list(corr.columns),
+        "matrix": [[None if pd.isna(value) else round(float(value), digits) for value in row] for row in corr.to_numpy()],
+    }
+
+
+def _rounded(values, digits=4):
+    return {key: (None if pd.isna(value) else round(float(value), digits)) for key, value in values.items()}
+
+
+def summarize(closes: pd.DataFrame, window: int = 20, benchmark: pd.Series = None) -> dict:
+    """Compact per-ticker figures over the whole frame, computed column-wise for all tickers at once."""
+    if closes.empty:
+        return {}
+    returns = daily_returns(closes)
+    first = closes.apply(lambda col: col.loc[col.first_valid_index()] if col.first_valid_index() is not None else np.nan)
+    last = closes.ffill().iloc[-1]
+    sma = moving_average(closes, window).ffill().iloc[-1]
+    vol = rolling_volatility(returns, window).ffill().iloc[-1]
+    dd = drawdown(closes)
+    figures = {
+        "last_close": _rounded(last, 2),
+        "total_return": _rounded(last / first - 1),
+        f"sma_{window}": _rounded(sma, 2),
+        f"price_vs_sma_{window}": _rounded(last / sma - 1),
+        f"volatility_{window}d_annualized": _rounded(vol),
+        "max_drawdown": _rounded(dd.min()),
+        "current_drawdown": _rounded(dd.ffill().iloc[-1]),
+    }
+    if benchmark is not None and not benchmark.empty:
+        figures["beta"] = _rounded(beta(returns, benchmark.pct_change(fill_method=None)))
+    return {ticker: {name: values[ticker] for name, values in figures.items()} for ticker in closes.columns}
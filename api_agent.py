@@ -1,120 +1,377 @@
-from fastapi import FastAPI, HTTPException, Query
-import yfinance as yf
-import requests
-from dotenv import load_dotenv
-import os
-from datetime import datetime
-
-load_dotenv()
-API_KEY = os.getenv("FINNHUB_API_KEY")
-
-app = FastAPI()
-
-RETRIEVER_URL = "http://localhost:8004/add_documents"
-
-def push_to_retriever(docs: list[str]):
-    try:
-        response = requests.post(RETRIEVER_URL, json={"docs": docs})
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
-
-@app.get("/marketdata/{ticker}")
-async def get_market_data(ticker: str):
-    try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-
-        if 'regularMarketPrice' not in info or info['regularMarketPrice'] is None:
-            raise HTTPException(status_code=404, detail=f"Ticker '{ticker}' not found or no market data available.")
-        
-        data = {
-            "ticker": ticker.upper(),
-            "current_price": info.get("regularMarketPrice"),
-            "previous_close": info.get("previousClose"),
-            "day_high": info.get("dayHigh"),
-            "day_low": info.get("dayLow"),
-            "volume": info.get("volume"),
-            "market_cap": info.get("marketCap"),
-        }
-        return {"data": data}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.get("/earnings/{ticker}")
-async def get_earnings(ticker: str):
-    try:
-        url = f"https://finnhub.io/api/v1/stock/earnings?symbol={ticker.upper()}&token={API_KEY}"
-        response = requests.get(url)
-
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail="Failed to fetch earnings data.")
-        
-        earnings = response.json()
-        if not earnings:
-            return {"data": {"ticker": ticker.upper(), "message": "No earnings data found."}}
-
-        latest = earnings[0]
-        return {
-            "data": {
-                "ticker": latest.get("symbol", ticker.upper()),
-                "date": latest.get("period", "N/A"),
-                "epsActual": latest.get("actual", "N/A"),
-                "epsEstimate": latest.get("estimate", "N/A"),
-                "surprisePercent": latest.get("surprisePercent", "N/A")
-            }
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.get("/historical/{ticker}")
-async def get_historical_data(
-    ticker: str, 
-    start: str = Query(None),
-    end: str = Query(None)
-):
-    try:
-        stock = yf.Ticker(ticker)
-        start_date = datetime.strptime(start, "%Y-%m-%d") if start else None
-        end_date = datetime.strptime(end, "%Y-%m-%d") if end else None
-        hist = stock.history(start=start_date, end=end_date)
-
-        if hist.empty:
-            return {"ticker": ticker.upper(), "data": [], "message": "No historical data found."}
-
-        data = [
-            {
-                "date": date.strftime("%Y-%m-%d"),
-                "open": round(row['Open'], 2),
-                "high": round(row['High'], 2),
-                "low": round(row['Low'], 2),
-                "close": round(row['Close'], 2),
-                "volume": int(row['Volume']),
-            }
-            for date, row in hist.iterrows()
-        ]
-        return {"ticker": ticker.upper(), "data": data}
-    except ValueError as ve:
-        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(ve)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.post("/push_to_retriever/{ticker}")
-async def push_api_data(ticker: str):
-    try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        if 'regularMarketPrice' not in info:
-            raise HTTPException(status_code=404, detail="Ticker not found or no data.")
-
-        summary = (
-            f"{ticker.upper()} current price: {info.get('regularMarketPrice')} USD. "
-            f"Prev close: {info.get('previousClose')}, high: {info.get('dayHigh')}, "
-            f"low: {info.get('dayLow')}, volume: {info.get('volume')}, market cap: {info.get('marketCap')}."
-        )
-        result = push_to_retriever([summary])
-        return {"summary": summary, "retriever_response": result}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+from fastapi import FastAPI, HTTPException, Query
+import yfinance as yf
+from dotenv import load_dotenv
+import asyncio
+import os
+import pandas as pd
+from datetime import datetime, date, timedelta
+
+import analytics
+import http_client
+import telemetry
+import upstream
+from market_cache import MarketCache, QUOTE_TTL, EARNINGS_TTL, OPEN_HISTORY_TTL, EMPTY_TTL
+from ohlcv_store import OHLCVStore, to_day, from_day, fetched_coverage, frame_to_columns, concat_columns, columns_to_json, columns_to_rows
+
+load_dotenv()
+API_KEY = os.getenv("FINNHUB_API_KEY")
+FINNHUB_URL = os.getenv("FINNHUB_URL", "https://finnhub.io/api/v1")  # overridable for the benchmark stubs
+
+app = FastAPI()
+
+RETRIEVER_URL = "http://localhost:8004/add_documents"
+
+telemetry.instrument(app, "api_agent")
+
+cache = MarketCache()
+bar_store = OHLCVStore()
+telemetry.gauge("market_cache_hits", "Market data cache hits.", lambda: cache.hits)
+telemetry.gauge("market_cache_misses", "Market data cache misses (upstream loads).", lambda: cache.misses)
+telemetry.gauge("market_cache_entries", "Entries in the market data cache.", lambda: len(cache._entries))
+
+MAX_BATCH_TICKERS = int(os.getenv("MAX_BATCH_TICKERS", "500"))
+ANALYTICS_LOOKBACK_DAYS = int(os.getenv("ANALYTICS_LOOKBACK_DAYS", "365"))
+
+@app.on_event("startup")
+async def startup_event():
+    http_client.get_async_client()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await http_client.close_async_client()
+
+async def push_to_retriever(docs: list[str], ticker: str = None):
+    try:
+        metadata = [{"ticker": ticker, "source": "api_agent"} for _ in docs]
+        client = http_client.get_async_client()
+        response = await client.post(RETRIEVER_URL, json={"docs": docs, "metadata": metadata})
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        return {"error": str(e)}
+
+async def get_info(ticker: str):
+    """yfinance ``.info`` for a ticker, shared by every quote endpoint for QUOTE_TTL seconds."""
+    async def load():
+        return await upstream.run_blocking("yfinance", lambda: yf.Ticker(ticker).info)
+    return await cache.get_or_load(f"info:{ticker.upper()}", load, QUOTE_TTL)
+
+async def get_finnhub_earnings(ticker: str):
+    async def load():
+        url = f"{FINNHUB_URL}/stock/earnings?symbol={ticker.upper()}&token={API_KEY}"
+        client = http_client.get_async_client()
+        response = await upstream.with_limit("finnhub", client.get(url))
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Failed to fetch earnings data.")
+        return response.json()
+    return await cache.get_or_load(f"earnings:{ticker.upper()}", load, EARNINGS_TTL)
+
+def history_ttl(end_date):
+    """Bars strictly before today are closed and never change; ranges reaching today are refreshed."""
+    if end_date is not None and end_date.date() <= date.today():
+        return None
+    return OPEN_HISTORY_TTL
+
+def parse_tickers(tickers: str) -> list[str]:
+    symbols = list(dict.fromkeys(t.strip().upper() for t in tickers.split(",") if t.strip()))
+    if not symbols:
+        raise HTTPException(status_code=400, detail="No tickers given.")
+    if len(symbols) > MAX_BATCH_TICKERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_TICKERS} tickers per request.")
+    return symbols
+
+def download_bars(tickers: list[str], **kwargs) -> dict:
+    """Daily OHLCV bars for many tickers from one yf.download call, as {ticker: DataFrame}."""
+    frame = yf.download(tickers, group_by="ticker", progress=False, threads=True, **kwargs)
+    bars = {}
+    if frame is None or frame.empty:
+        return bars
+    if not isinstance(frame.columns, pd.MultiIndex):
+        frame = pd.concat({tickers[0]: frame}, axis=1)
+    for ticker in tickers:
+        if ticker in frame.columns.get_level_values(0):
+            df = frame[ticker].dropna(subset=["Close"])
+            if not df.empty:
+                bars[ticker] = df
+    return bars
+
+def history_window(start_date, end_date):
+    """Day range for a history request; with no dates this is the last month, like yfinance's default."""
+    end_day = to_day(end_date) if end_date else to_day(date.today() + timedelta(days=1))
+    start_day = to_day(start_date) if start_date else end_day - 31
+    return start_day, end_day
+
+def store_bars(bars: dict, gaps: dict) -> dict:
+    """Converts downloaded frames to columns and merges each ticker's answered gaps into the bar store.
+
+    Runs on a worker thread.
+    """
+    columns = {}
+    for ticker, df in bars.items():
+        cols = frame_to_columns(df)
+        covered = fetched_coverage(cols["date"], gaps.get(ticker, []))
+        if covered:
+            with bar_store.lock(ticker):
+                bar_store.merge(ticker, cols, covered)
+        columns[ticker] = cols
+    return columns
+
+async def load_bars(tickers: list[str], start_day: int, end_day: int) -> dict:
+    """Daily bars per ticker for [start_day, end_day), served from the local store.
+
+    Tickers with missing closed days are fetched in one multi-symbol download over the union
+    of their gaps, and coverage is recorded per ticker from its own gaps. Bars for today
+    (still open) are fetched live and never stored; fully stored tickers fetch only today.
+    Store reads and writes run on worker threads, off the event loop.
+    """
+    today = to_day(date.today())
+    gaps = await asyncio.to_thread(lambda: {t: bar_store.gaps(t, start_day, end_day) for t in tickers})
+    fetches = []
+    missing = [t for t in tickers if gaps[t]]
+    if missing:
+        lo = min(gaps[t][0][0] for t in missing)
+        hi = max(gaps[t][-1][1] for t in missing)
+        fetches.append((missing, lo, max(hi, end_day) if end_day > today else hi))
+    current = [t for t in tickers if not gaps[t]] if end_day > today else []
+    if current:
+        fetches.append((current, max(today, start_day), end_day))
+    downloads = await asyncio.gather(*(
+        upstream.run_blocking(
+            "yfinance", download_bars, group, start=from_day(lo).isoformat(), end=from_day(hi).isoformat(), interval="1d"
+        )
+        for group, lo, hi in fetches
+    ))
+    live = {}
+    for bars in downloads:
+        for ticker, cols in (await asyncio.to_thread(store_bars, bars, gaps)).items():
+            is_live = cols["date"] >= max(today, start_day)
+            live[ticker] = {name: values[is_live] for name, values in cols.items()}
+    stored = await asyncio.to_thread(lambda: {t: bar_store.read(t, start_day, min(end_day, today)) for t in tickers})
+    return {t: concat_columns(stored[t], live.get(t)) for t in tickers}
+
+QUOTE_FIELDS = ["current_price", "previous_close", "day_high", "day_low", "volume", "market_cap"]
+
+def quote_from_info(ticker: str, info: dict) -> dict:
+    return {
+        "ticker": ticker.upper(),
+        "current_price": info.get("regularMarketPrice"),
+        "previous_close": info.get("previousClose"),
+        "day_high": info.get("dayHigh"),
+        "day_low": info.get("dayLow"),
+        "volume": info.get("volume"),
+        "market_cap": info.get("marketCap"),
+    }
+
+@app.get("/cache_stats")
+async def cache_stats():
+    return dict(cache.stats(), upstreams=upstream.stats())
+
+@app.get("/marketdata/{ticker}")
+async def get_market_data(ticker: str):
+    try:
+        info = await get_info(ticker)
+
+        if 'regularMarketPrice' not in info or info['regularMarketPrice'] is None:
+            raise HTTPException(status_code=404, detail=f"Ticker '{ticker}' not found or no market data available.")
+        
+        return {"data": quote_from_info(ticker, info)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/earnings/{ticker}")
+async def get_earnings(ticker: str):
+    try:
+        earnings = await get_finnhub_earnings(ticker)
+        if not earnings:
+            return {"data": {"ticker": ticker.upper(), "message": "No earnings data found."}}
+
+        latest = earnings[0]
+        return {
+            "data": {
+                "ticker": latest.get("symbol", ticker.upper()),
+                "date": latest.get("period", "N/A"),
+                "epsActual": latest.get("actual", "N/A"),
+                "epsEstimate": latest.get("estimate", "N/A"),
+                "surprisePercent": latest.get("surprisePercent", "N/A")
+            }
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/historical/{ticker}")
+async def get_historical_data(
+    ticker: str, 
+    start: str = Query(None),
+    end: str = Query(None)
+):
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d") if start else None
+        end_date = datetime.strptime(end, "%Y-%m-%d") if end else None
+
+        async def load():
+            bars = await load_bars([ticker.upper()], *history_window(start_date, end_date))
+            return columns_to_rows(bars[ticker.upper()])
+
+        data = await cache.get_or_load(f"historical:{ticker.upper()}:{start}:{end}", load, history_ttl(end_date))
+        if not data:
+            return {"ticker": ticker.upper(), "data": [], "message": "No historical data found."}
+        return {"ticker": ticker.upper(), "data": data}
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(ve)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/push_to_retriever/{ticker}")
+async def push_api_data(ticker: str):
+    try:
+        info = await get_info(ticker)
+        if 'regularMarketPrice' not in info:
+            raise HTTPException(status_code=404, detail="Ticker not found or no data.")
+
+        summary = (
+            f"{ticker.upper()} current price: {info.get('regularMarketPrice')} USD. "
+            f"Prev close: {info.get('previousClose')}, high: {info.get('dayHigh')}, "
+            f"low: {info.get('dayLow')}, volume: {info.get('volume')}, market cap: {info.get('marketCap')}."
+        )
+        result = await push_to_retriever([summary], ticker.upper())
+        return {"summary": summary, "retriever_response": result}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/batch/marketdata")
+async def get_batch_market_data(tickers: str = Query(..., description="Comma-separated symbols")):
+    """Latest quotes for a watchlist as parallel columns, with the same fields as /marketdata.
+
+    Quotes come from the per-ticker ``.info`` cache shared with /marketdata; misses are fetched
+    concurrently under the yfinance upstream limit.
+    """
+    try:
+        symbols = parse_tickers(tickers)
+
+        async def quote(ticker):
+            try:
+                info = await get_info(ticker)
+            except Exception:  # one failing symbol is reported as missing, not a failed batch
+                return None
+            return quote_from_info(ticker, info) if info.get("regularMarketPrice") is not None else None
+
+        quotes = dict(zip(symbols, await asyncio.gather(*(quote(t) for t in symbols))))
+        found = [t for t in symbols if quotes[t]]
+        return {
+            "tickers": found,
+            "columns": {field: [quotes[t][field] for t in found] for field in QUOTE_FIELDS},
+            "missing": [t for t in symbols if t not in found],
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/batch/historical")
+async def get_batch_historical_data(
+    tickers: str = Query(..., description="Comma-separated symbols"),
+    start: str = Query(None),
+    end: str = Query(None)
+):
+    """Daily bars for a watchlist from one multi-symbol download, columnar per ticker."""
+    try:
+        symbols = parse_tickers(tickers)
+        start_date = datetime.strptime(start, "%Y-%m-%d") if start else None
+        end_date = datetime.strptime(end, "%Y-%m-%d") if end else None
+
+        async def load(keys):
+            bars = await load_bars([key.split(":")[1] for key in keys], *history_window(start_date, end_date))
+            return {
+                f"historical_cols:{ticker}:{start}:{end}": columns_to_json(cols)
+                for ticker, cols in bars.items() if len(cols["date"])
+            }
+
+        keys = {t: f"historical_cols:{t}:{start}:{end}" for t in symbols}
+        columns = await cache.get_many_or_load(list(keys.values()), load, history_ttl(end_date))
+        return {
+            "data": {t: columns[key] for t, key in keys.items() if columns.get(key)},
+            "missing": [t for t, key in keys.items() if not columns.get(key)],
+        }
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(ve)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def load_close_matrix(symbols: list[str], start_date, end_date):
+    end_day = history_window(start_date, end_date)[1]
+    start_day = to_day(start_date) if start_date else end_day - ANALYTICS_LOOKBACK_DAYS
+    return analytics.close_matrix(await load_bars(symbols, start_day, end_day))
+
+@app.get("/analytics/summary")
+async def get_analytics_summary(
+    tickers: str = Query(..., description="Comma-separated symbols"),
+    start: str = Query(None),
+    end: str = Query(None),
+    window: int = Query(20, ge=2, le=analytics.TRADING_DAYS),
+    benchmark: str = Query("SPY", description="Index for beta; empty to skip")
+):
+    """Returns, SMA, rolling volatility, drawdown and beta per ticker, computed for the whole watchlist at once."""
+    try:
+        symbols = parse_tickers(tickers)
+        start_date = datetime.strptime(start, "%Y-%m-%d") if start else None
+        end_date = datetime.strptime(end, "%Y-%m-%d") if end else None
+        bench = benchmark.strip().upper()
+
+        async def load():
+            closes = await load_close_matrix(list(dict.fromkeys(symbols + ([bench] if bench else []))), start_date, end_date)
+            bench_closes = closes[bench] if bench in closes else None
+            return analytics.summarize(closes[[t for t in symbols if t in closes]], window, bench_closes)
+
+        def ttl(summary):
+            return history_ttl(end_date) if all(t in summary for t in symbols) else EMPTY_TTL
+
+        key = f"analytics:summary:{','.join(sorted(symbols))}:{window}:{bench}:{start}:{end}"
+        summary = await cache.get_or_load(key, load, ttl)
+        return {"window": window, "benchmark": bench or None, "data": summary,
+                "missing": [t for t in symbols if t not in summary]}
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(ve)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analytics/correlation")
+async def get_analytics_correlation(
+    tickers: str = Query(..., description="Comma-separated symbols"),
+    start: str = Query(None),
+    end: str = Query(None)
+):
+    """Correlation matrix of daily returns across the watchlist."""
+    try:
+        symbols = parse_tickers(tickers)
+        start_date = datetime.strptime(start, "%Y-%m-%d") if start else None
+        end_date = datetime.strptime(end, "%Y-%m-%d") if end else None
+
+        async def load():
+            closes = await load_close_matrix(symbols, start_date, end_date)
+            return analytics.correlation_matrix(analytics.daily_returns(closes))
+
+        def ttl(result):
+            complete = len(result["tickers"]) == len(symbols) and all(None not in row for row in result["matrix"])
+            return history_ttl(end_date) if complete else EMPTY_TTL
+
+        key = f"analytics:correlation:{','.join(sorted(symbols))}:{start}:{end}"
+        return await cache.get_or_load(key, load, ttl)
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(ve)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,26 @@
+"""Offline benchmarks for the agent fleet. Run everything from the repository root.
+
+Micro-benchmarks (no servers needed):
+
+    python -m benchmarks.micro                       # all of them
+    python -m benchmarks.micro parse_query build_context history_serialization
+    python -m benchmarks.micro search --sizes 10000,100000,1000000 --index-types flat,hnsw
+    python -m benchmarks.micro encode                # needs sentence-transformers
+    python -m benchmarks.embedding                   # embedding backends and fp16/sq8/PQ vector storage
+
+End-to-end load test against /receive_transcription, with the market-data upstreams and
+the LLM replaced by local stubs:
+
+    python -m benchmarks.stub_servers market --port 8090
+    python -m benchmarks.stub_servers llm --port 8005
+    export PYTHONPATH=benchmarks/stubs STUB_MARKET_URL=http://127.0.0.1:8090 FINNHUB_URL=http://127.0.0.1:8090
+    uvicorn api_agent:app --port 8002
+    uvicorn scraper:app --port 8003
+    uvicorn retriever_agent:app --port 8004
+    uvicorn main:app --port 8000
+    python -m benchmarks.load --concurrency 8 --requests 400
+
+Each run writes a JSON file under benchmarks/results/ (or --output); compare two runs with
+
+    python -m benchmarks.compare benchmarks/results/a.json benchmarks/results/b.json
+"""
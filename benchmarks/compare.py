@@ -0,0 +1,53 @@
+"""Side-by-side comparison of two result files from the same suite."""
+import argparse
+import json
+
+# metrics where a larger value is better; everything else compared is a latency
+HIGHER_IS_BETTER = ("ops_per_sec", "qps", "rps", "docs_per_sec", "add_docs_per_sec", "recall", "recall_at_k",
+                    "mean_cosine_to_baseline")
+KEY_FIELDS = ("benchmark", "query", "tickers", "rows", "method", "documents", "backend", "index_type", "nprobe",
+              "ef_search", "batch_size", "concurrency")
+
+
+def flatten(result: dict, prefix: str = "") -> dict:
+    out = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            out.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[f"{prefix}{key}"] = value
+    return out
+
+
+def result_key(result: dict) -> tuple:
+    return tuple((field, result[field]) for field in KEY_FIELDS if field in result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--metrics", default="ops_per_sec,qps,rps,docs_per_sec,latency_ms.p50,latency_ms.p99,"
+                                             "latency_us.p50,latency_us.p99,recall,recall_at_k,mb_per_million_docs")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = {result_key(r): flatten(r) for r in json.load(f)["results"]}
+    with open(args.candidate) as f:
+        candidate = {result_key(r): flatten(r) for r in json.load(f)["results"]}
+    metrics = args.metrics.split(",")
+    for key in baseline:
+        if key not in candidate:
+            continue
+        label = " ".join(f"{field}={value}" for field, value in key)
+        for metric in metrics:
+            before, after = baseline[key].get(metric), candidate[key].get(metric)
+            if before is None or after is None:
+                continue
+            change = (after / before - 1) * 100 if before else float("inf")
+            better = change > 0 if metric.split(".")[0] in HIGHER_IS_BETTER else change < 0
+            print(f"{label:70.70} {metric:24} {before:>14.4f} {after:>14.4f} {change:+8.1f}% {'better' if better else 'worse' if change else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Embedding backends and vector storage: throughput, memory per million documents and retrieval quality.
+
+Backends are compared with the float32 ``torch`` baseline on the same texts: docs/sec per
+batch size, mean cosine similarity to the baseline vectors, and recall@k of each backend's
+nearest neighbours against the baseline's. Storage types are built over the baseline
+vectors (synthetic ones when no model can be loaded) and compared with exact float32 search.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.micro import synthetic_vectors
+from benchmarks.results import write_results
+
+TICKERS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "AMD", "JPM", "XOM", "KO", "PFE"]
+TEMPLATES = [
+    "{t} net income for the quarter ending {d} was {x:.2f} billion dollars.",
+    "{t} closed at {x:.2f} on {d}, with volume of {v} shares.",
+    "{t} reported EPS of {y:.2f} against an estimate of {z:.2f}, a surprise of {s:+.1f}%.",
+    "Analysts expect {t} revenue growth of {s:.1f}% next quarter after {d}.",
+    "{t} daily bars from {d}: open {x:.2f}, high {y:.2f}, low {z:.2f}.",
+    "{t} quote: price {x:.2f} (previous close {y:.2f}), market cap {v} million.",
+]
+
+
+def make_texts(count: int, seed: int = 0) -> list[str]:
+    rng = np.random.default_rng(seed)
+    texts = []
+    for i in range(count):
+        texts.append(TEMPLATES[i % len(TEMPLATES)].format(
+            t=TICKERS[rng.integers(len(TICKERS))], d=f"2025-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}",
+            x=rng.uniform(10, 500), y=rng.uniform(0.1, 10), z=rng.uniform(0.1, 10), s=rng.normal(0, 5),
+            v=rng.integers(10_000, 90_000_000),
+        ))
+    return texts
+
+
+def normalized(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def neighbours(corpus: np.ndarray, queries: np.ndarray, top_k: int) -> np.ndarray:
+    import faiss
+
+    index = faiss.IndexFlatL2(corpus.shape[1])
+    index.add(np.ascontiguousarray(corpus, dtype="float32"))
+    return index.search(np.ascontiguousarray(queries, dtype="float32"), top_k)[1]
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(a) & set(b)) for a, b in zip(found, truth))
+    return round(hits / truth.size, 4)
+
+
+def bench_backends(args, corpus_texts, query_texts):
+    from embedder import load_embedding_model
+
+    results, baseline = [], None
+    for backend in args.backends:
+        try:
+            model = load_embedding_model(backend=backend, threads=args.threads)
+        except Exception as e:  # missing optional dependency or export
+            results.append({"benchmark": "embedding_backend", "backend": backend, "skipped": f"{type(e).__name__}: {e}"})
+            print(results[-1])
+            continue
+        model.encode(corpus_texts[:64])
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            corpus = model.encode(corpus_texts, batch_size=batch_size, convert_to_numpy=True)
+            elapsed = time.perf_counter() - start
+            results.append({"benchmark": "embedding_backend", "backend": backend, "batch_size": batch_size,
+                            "threads": args.threads or None, "documents": len(corpus_texts),
+                            "docs_per_sec": round(len(corpus_texts) / elapsed, 1)})
+        queries = model.encode(query_texts, convert_to_numpy=True)
+        if baseline is None:
+            baseline = {"backend": backend, "corpus": corpus, "queries": queries,
+                        "truth": neighbours(corpus, queries, args.top_k)}
+        quality = {
+            "baseline": baseline["backend"],
+            "mean_cosine_to_baseline": round(float(np.mean(np.sum(
+                normalized(corpus) * normalized(baseline["corpus"]), axis=1))), 5),
+            "recall_at_k": recall_at_k(neighbours(corpus, queries, args.top_k), baseline["truth"]),
+            "top_k": args.top_k,
+        }
+        for result in results:
+            if result.get("backend") == backend and "skipped" not in result:
+                result.update(quality)
+        print([r for r in results if r.get("backend") == backend])
+    return results, baseline
+
+
+def bench_storage(args, baseline):
+    from vector_store import recall_report
+
+    if baseline is not None:
+        vectors, queries, source = baseline["corpus"].astype("float32"), baseline["queries"].astype("float32"), baseline["backend"]
+    else:
+        # one draw so queries come from the corpus's clusters (each seed picks its own centroids)
+        vectors = synthetic_vectors(args.storage_docs + args.queries, 384)
+        vectors, queries = vectors[:args.storage_docs], vectors[args.storage_docs:]
+        source = "synthetic"
+    results = []
+    for row in recall_report(vectors, queries, args.top_k, args.index_types):
+        if "error" in row:
+            continue
+        results.append(dict(row, benchmark="vector_storage", vectors_from=source, documents=len(vectors),
+                            mb_per_million_docs=row["bytes_per_vector"]))  # N bytes per vector is N MB per million
+    for result in results:
+        print(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", type=lambda s: s.split(","), default=["torch", "torch_int8", "onnx", "onnx_int8"],
+                        help="the first one that loads is the quality baseline")
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--batch-sizes", type=lambda s: [int(b) for b in s.split(",")], default=[1, 32, 128])
+    parser.add_argument("--docs", type=int, default=5000, help="texts encoded per backend")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--storage-docs", type=int, default=100_000, help="synthetic vectors when no backend loads")
+    parser.add_argument("--index-types", type=lambda s: s.split(","), default=["flat", "fp16", "sq8", "ivf_pq", "ivf_flat"])
+    parser.add_argument("--output", help="JSON file to write (default: benchmarks/results/embedding-<time>.json)")
+    args = parser.parse_args()
+
+    corpus_texts = make_texts(args.docs)
+    query_texts = make_texts(args.queries, seed=1)
+    results, baseline = bench_backends(args, corpus_texts, query_texts)
+    results += bench_storage(args, baseline)
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    print(f"Wrote {write_results('embedding', results, params, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
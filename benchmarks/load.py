@@ -0,0 +1,90 @@
+"""Closed-loop load generator for the orchestrator's /receive_transcription endpoint.
+
+``--concurrency`` clients each send one request at a time until ``--requests`` have
+completed or ``--duration`` seconds have passed. Reports throughput, latency percentiles,
+status codes and the mean of each stage timing the orchestrator returns.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+from benchmarks.micro import QUERIES
+from benchmarks.results import percentiles, write_results
+
+
+async def run_load(url: str, queries: list[str], concurrency: int, total: int, duration: float, payload_extra: dict):
+    latencies, statuses, errors = [], Counter(), Counter()
+    stage_totals, stage_counts = defaultdict(float), Counter()
+    sequence = itertools.count()
+    deadline = time.perf_counter() + duration if duration else None
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=300) as client:
+        async def worker():
+            while True:
+                n = next(sequence)
+                if (total and n >= total) or (deadline and time.perf_counter() >= deadline):
+                    return
+                payload = {"transcription": queries[n % len(queries)], **payload_extra}
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json=payload)
+                except httpx.HTTPError as e:
+                    errors[type(e).__name__] += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] += 1
+                if response.status_code == 200:
+                    for stage, ms in (response.json().get("timings") or {}).items():
+                        if isinstance(ms, (int, float)):
+                            stage_totals[stage] += ms
+                            stage_counts[stage] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "benchmark": "receive_transcription",
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "elapsed_seconds": round(elapsed, 2),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": percentiles(latencies),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "errors": dict(errors),
+        "stage_ms_mean": {stage: round(stage_totals[stage] / stage_counts[stage], 1) for stage in sorted(stage_totals)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://127.0.0.1:8000/receive_transcription")
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[8],
+                        help="comma-separated levels run one after another, e.g. 1,4,16")
+    parser.add_argument("--requests", type=int, default=200, help="per concurrency level; 0 to use --duration only")
+    parser.add_argument("--duration", type=float, default=0, help="seconds per concurrency level")
+    parser.add_argument("--warmup", type=int, default=10, help="requests sent first and left out of the results")
+    parser.add_argument("--sequential", action="store_true", help="disable pipelined orchestration for these requests")
+    parser.add_argument("--output", help="JSON file to write (default: benchmarks/results/load-<time>.json)")
+    args = parser.parse_args()
+
+    # TTS playback would serialize on the speakers, so the load test never asks for it
+    extra = {"speak": False, "pipelined": not args.sequential}
+    results = []
+    if args.warmup:
+        asyncio.run(run_load(args.url, QUERIES, 1, args.warmup, 0, extra))
+    for concurrency in args.concurrency:
+        result = asyncio.run(run_load(args.url, QUERIES, concurrency, args.requests, args.duration, extra))
+        print(result)
+        results.append(result)
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    print(f"Wrote {write_results('load', results, params, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
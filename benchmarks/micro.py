@@ -0,0 +1,256 @@
+"""Micro-benchmarks for the hot paths that do not need a running fleet."""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+# the benchmark trains and snapshots the index itself; keep the maintenance thread out of the timings
+os.environ.setdefault("TRAIN_MIN_VECTORS", str(10 ** 12))
+os.environ.setdefault("SNAPSHOT_EVERY_DOCS", str(10 ** 12))
+os.environ.setdefault("SNAPSHOT_INTERVAL", str(10 ** 6))
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.results import percentiles, write_results
+
+QUERIES = [
+    "What is the price of AAPL?",
+    "Show me earnings for MSFT and the stock price of NVDA",
+    "historical data for $TSLA",
+    "How did Amazon AMZN do last quarter and what are GOOGL earnings",
+    "Is IT a good time to buy BRK.B?",
+    "compare META price and NFLX history",
+    "tell me about the market today",
+    "AMD, INTC and QCOM prices",
+]
+
+
+def timed(fn, iterations: int, warmup: int = 10) -> list[float]:
+    for _ in range(min(warmup, iterations)):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def latency_result(name: str, samples: list[float], **extra) -> dict:
+    return {"benchmark": name, "iterations": len(samples), "ops_per_sec": round(len(samples) / sum(samples), 1),
+            "latency_us": percentiles(samples, scale=1e6), **extra}
+
+
+def bench_parse_query(args) -> list[dict]:
+    from query_parser import QueryParser, load_tickers
+
+    parser = QueryParser(load_tickers())  # matcher path only, no spaCy confirmation of ambiguous symbols
+    results = []
+    for query in QUERIES:
+        samples = timed(lambda: parser.parse(query), args.iterations)
+        results.append(latency_result("parse_query", samples, query=query, tickers=len(parser.parse(query))))
+    return results
+
+
+def _history_rows(rng, days: int) -> list[dict]:
+    close = 100 + np.cumsum(rng.normal(0, 1, days))
+    dates = pd.bdate_range("2024-01-01", periods=days).strftime("%Y-%m-%d")
+    return [{"date": d, "open": round(c - 0.5, 2), "high": round(c + 1, 2), "low": round(c - 1, 2),
+             "close": round(c, 2), "volume": int(v)} for d, c, v in zip(dates, close, rng.integers(1e5, 1e7, days))]
+
+
+def _agent_data(rng, tickers: list[str]):
+    intents = ["price", "earnings", "historical"]
+    data, intent_map = {}, {}
+    for i, ticker in enumerate(tickers):
+        intent = intents[i % len(intents)]
+        intent_map[ticker] = intent
+        if intent == "price":
+            data[ticker] = {"data": {"ticker": ticker, "current_price": 187.3, "previous_close": 185.1,
+                                     "day_high": 188.0, "day_low": 184.9, "volume": 51234567, "market_cap": 2.9e12}}
+        elif intent == "earnings":
+            data[ticker] = {
+                "api_earnings": {"data": {"ticker": ticker, "date": "2025-03-31", "epsActual": 1.65,
+                                          "epsEstimate": 1.6, "surprisePercent": 3.1}},
+                "scraping": {"summaries": [f"{ticker} net income: 2025-03-31: 24780000000.0, 2024-12-31: 36330000000.0"]},
+            }
+        else:
+            data[ticker] = {"ticker": ticker, "data": _history_rows(rng, 21)}
+    return data, intent_map
+
+
+def bench_build_context(args) -> list[dict]:
+    from context_builder import build_context
+
+    rng = np.random.default_rng(0)
+    results = []
+    for count in (1, 5, 20):
+        tickers = [f"T{i:03d}" for i in range(count)]
+        agent_data, intent_map = _agent_data(rng, tickers)
+        _, stats = build_context(agent_data, intent_map)
+        samples = timed(lambda: build_context(agent_data, intent_map), args.iterations)
+        results.append(latency_result("build_context", samples, tickers=count, **stats))
+    return results
+
+
+def _history_frame(rng, days: int) -> pd.DataFrame:
+    close = 100 + np.cumsum(rng.normal(0, 1, days))
+    return pd.DataFrame(
+        {"Open": close - 0.5, "High": close + 1, "Low": close - 1, "Close": close,
+         "Volume": rng.integers(1e5, 1e7, days).astype("float64")},
+        index=pd.DatetimeIndex(pd.bdate_range("2000-01-03", periods=days, tz="America/New_York"), name="Date"),
+    )
+
+
+def iterrows_rows(hist: pd.DataFrame) -> list[dict]:
+    """The original /historical serialization, kept here as the baseline."""
+    return [
+        {
+            "date": date.strftime("%Y-%m-%d"),
+            "open": round(row['Open'], 2),
+            "high": round(row['High'], 2),
+            "low": round(row['Low'], 2),
+            "close": round(row['Close'], 2),
+            "volume": int(row['Volume']),
+        }
+        for date, row in hist.iterrows()
+    ]
+
+
+def bench_history_serialization(args) -> list[dict]:
+    from ohlcv_store import columns_to_rows, frame_to_columns
+
+    rng = np.random.default_rng(0)
+    results = []
+    for days in (21, 252, 2520):
+        hist = _history_frame(rng, days)
+        iterations = max(3, args.iterations // max(days // 21, 1))
+        baseline = timed(lambda: iterrows_rows(hist), iterations, warmup=1)
+        columnar = timed(lambda: columns_to_rows(frame_to_columns(hist)), iterations, warmup=1)
+        speedup = round(float(np.median(baseline) / np.median(columnar)), 1)
+        results.append(latency_result("history_serialization", baseline, rows=days, method="iterrows"))
+        results.append(latency_result("history_serialization", columnar, rows=days, method="columns_to_rows",
+                                      speedup_vs_iterrows=speedup))
+    return results
+
+
+def synthetic_vectors(count: int, dim: int, seed: int = 0, clusters: int = 256) -> np.ndarray:
+    """Unit vectors drawn around random centroids, closer to sentence embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dim)).astype("float32")
+    out = np.empty((count, dim), dtype="float32")
+    for start in range(0, count, 100_000):
+        stop = min(count, start + 100_000)
+        block = centroids[rng.integers(0, clusters, stop - start)] + 0.6 * rng.normal(size=(stop - start, dim))
+        out[start:stop] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return out
+
+
+def bench_search(args) -> list[dict]:
+    from vector_store import EMBEDDING_DIM, VectorStore, index_type_of
+
+    results = []
+    for size in args.sizes:
+        vectors = synthetic_vectors(size + args.queries, EMBEDDING_DIM)
+        corpus, queries = vectors[:size], vectors[size:]
+        texts = [f"doc {i}" for i in range(size)]
+        for index_type in args.index_types:
+            data_dir = tempfile.mkdtemp(prefix="bench-store-")
+            store = VectorStore(data_dir=data_dir, index_type=index_type)
+            try:
+                store.open()
+                start = time.perf_counter()
+                for lo in range(0, size, 10_000):
+                    chunk = slice(lo, min(size, lo + 10_000))
+                    store.add(texts[chunk], lambda _, chunk=chunk: corpus[chunk])
+                add_s = time.perf_counter() - start
+                train_s = 0.0
+                if index_type_of(store.index) != index_type:
+                    start = time.perf_counter()
+                    store.train(index_type)
+                    train_s = time.perf_counter() - start
+                samples = []
+                for query in queries:
+                    start = time.perf_counter()
+                    store.search(query[None, :], args.top_k)
+                    samples.append(time.perf_counter() - start)
+                results.append({
+                    "benchmark": "search", "documents": size, "index_type": index_type, "top_k": args.top_k,
+                    "add_docs_per_sec": round(size / add_s, 1), "train_seconds": round(train_s, 2),
+                    "queries": len(samples), "qps": round(len(samples) / sum(samples), 1),
+                    "latency_ms": percentiles(samples),
+                })
+            finally:
+                store.close()
+                shutil.rmtree(data_dir, ignore_errors=True)
+            print(results[-1])
+    return results
+
+
+def bench_encode(args) -> list[dict]:
+    """Model throughput on a sample; larger corpus sizes are projected from it, not encoded."""
+    from embedder import EMBEDDING_BACKEND, load_embedding_model
+
+    try:
+        model = load_embedding_model()
+    except ImportError as e:
+        return [{"benchmark": "encode", "skipped": f"embedding backend is not installed ({e})"}]
+    tickers = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "AMD"]
+    texts = [f"{tickers[i % len(tickers)]} net income for the quarter ending 2025-03-31 was {i * 1.37:.2f} billion."
+             for i in range(args.encode_docs)]
+    results = []
+    for batch_size in args.batch_sizes:
+        model.encode(texts[:batch_size], batch_size=batch_size)
+        start = time.perf_counter()
+        model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        elapsed = time.perf_counter() - start
+        rate = len(texts) / elapsed
+        results.append({
+            "benchmark": "encode", "backend": EMBEDDING_BACKEND, "batch_size": batch_size, "documents": len(texts),
+            "docs_per_sec": round(rate, 1),
+            "projected_seconds": {str(size): round(size / rate, 1) for size in args.sizes},
+        })
+    return results
+
+
+BENCHMARKS = {
+    "parse_query": bench_parse_query,
+    "build_context": bench_build_context,
+    "history_serialization": bench_history_serialization,
+    "search": bench_search,
+    "encode": bench_encode,
+}
+
+
+def int_list(text: str) -> list[int]:
+    return [int(part) for part in text.split(",") if part]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("benchmarks", nargs="*", help=f"any of {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--sizes", type=int_list, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--index-types", type=lambda s: s.split(","), default=["flat"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--encode-docs", type=int, default=2000)
+    parser.add_argument("--batch-sizes", type=int_list, default=[1, 32, 128])
+    parser.add_argument("--output", help="JSON file to write (default: benchmarks/results/micro-<time>.json)")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = []
+    for name in args.benchmarks or list(BENCHMARKS):
+        print(f"Running {name}...")
+        results += BENCHMARKS[name](args)
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    print(f"Wrote {write_results('micro', results, params, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
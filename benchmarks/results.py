@@ -0,0 +1,41 @@
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentiles(samples, scale: float = 1000.0) -> dict:
+    """p50/p95/p99/mean/max of ``samples`` (seconds), in milliseconds by default."""
+    if not len(samples):
+        return {}
+    values = np.asarray(samples, dtype="float64") * scale
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 4), "p95": round(float(p95), 4), "p99": round(float(p99), 4),
+            "mean": round(float(values.mean()), 4), "max": round(float(values.max()), 4)}
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "commit": commit}
+
+
+def write_results(suite: str, results: list[dict], params: dict, output: str = None) -> str:
+    """Writes one run as JSON (``suite``, ``params``, ``environment``, ``results``) and returns the path."""
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{suite}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    run = {"suite": suite, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "params": params,
+           "environment": environment(), "results": results}
+    with open(output, "w") as f:
+        json.dump(run, f, indent=2, default=str)
+    return output
@@ -0,0 +1,166 @@
+"""Local stand-ins for the market-data upstreams (Yahoo Finance, Finnhub) and the LLM agent.
+
+Responses are synthetic but deterministic per ticker, and every call sleeps for a
+configurable latency so the fleet can be load-tested without network access or a model.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import zlib
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+# Stub behaviour
+UPSTREAM_LATENCY_MS = float(os.getenv("STUB_UPSTREAM_LATENCY_MS", "50"))
+LLM_FIRST_TOKEN_MS = float(os.getenv("STUB_LLM_FIRST_TOKEN_MS", "200"))  # prompt processing
+LLM_TOKEN_MS = float(os.getenv("STUB_LLM_TOKEN_MS", "20"))
+LLM_TOKENS = int(os.getenv("STUB_LLM_TOKENS", "60"))
+
+market_app = FastAPI()
+llm_app = FastAPI()
+
+
+def _rng(*parts) -> np.random.Generator:
+    return np.random.default_rng(zlib.crc32("|".join(map(str, parts)).encode()))
+
+
+async def _upstream_delay():
+    await asyncio.sleep(UPSTREAM_LATENCY_MS / 1000 * random.uniform(0.5, 1.5))
+
+
+def _bars(ticker: str, start: date, end: date) -> dict:
+    days = [start + timedelta(days=i) for i in range((end - start).days)]
+    days = [d for d in days if d.weekday() < 5]
+    rng = _rng(ticker)
+    base = 20 + rng.random() * 480
+    # each day's price depends only on the ticker and the date, so overlapping ranges agree
+    offsets = np.array([(d - date(2000, 1, 1)).days for d in days], dtype="float64")
+    noise = np.array([_rng(ticker, int(o)).normal(0, 0.01) for o in offsets])
+    close = base * (1 + 0.2 * np.sin(offsets / 40)) * (1 + noise)
+    open_ = close * (1 + rng.normal(0, 0.004, len(days)))
+    return {
+        "date": [d.isoformat() for d in days],
+        "open": open_.round(4).tolist(),
+        "high": (np.maximum(open_, close) * 1.01).round(4).tolist(),
+        "low": (np.minimum(open_, close) * 0.99).round(4).tolist(),
+        "close": close.round(4).tolist(),
+        "volume": rng.integers(100_000, 50_000_000, len(days)).tolist(),
+    }
+
+
+@market_app.get("/info/{ticker}")
+async def info(ticker: str):
+    """Subset of yfinance ``Ticker.info`` that the agents read."""
+    await _upstream_delay()
+    rng = _rng(ticker)
+    price = round(20 + rng.random() * 480, 2)
+    return {
+        "symbol": ticker.upper(),
+        "regularMarketPrice": price,
+        "previousClose": round(price * (1 + rng.normal(0, 0.01)), 2),
+        "dayHigh": round(price * 1.01, 2),
+        "dayLow": round(price * 0.99, 2),
+        "volume": int(rng.integers(100_000, 50_000_000)),
+        "marketCap": int(price * rng.integers(10**8, 10**10)),
+    }
+
+
+@market_app.get("/download")
+async def download(tickers: str, start: Optional[str] = None, end: Optional[str] = None):
+    """Daily bars per ticker in columnar form, as a multi-symbol yf.download would return them."""
+    await _upstream_delay()
+    end_day = date.fromisoformat(end) if end else date.today() + timedelta(days=1)
+    start_day = date.fromisoformat(start) if start else end_day - timedelta(days=31)
+    return {ticker: _bars(ticker, start_day, end_day) for ticker in tickers.split(",") if ticker}
+
+
+@market_app.get("/income/{ticker}")
+async def income(ticker: str):
+    """Quarterly net income, newest first, like ``Ticker.quarterly_income_stmt``."""
+    await _upstream_delay()
+    rng = _rng(ticker, "income")
+    quarters = [date(date.today().year, 1, 1) - timedelta(days=91 * i) for i in range(4)]
+    return {"dates": [q.isoformat() for q in quarters], "net_income": (rng.normal(1, 0.3, 4) * 1e9).round().tolist()}
+
+
+@market_app.get("/stock/earnings")
+async def earnings(symbol: str, token: Optional[str] = None):
+    """Finnhub ``/stock/earnings`` layout."""
+    await _upstream_delay()
+    rng = _rng(symbol, "earnings")
+    results = []
+    for i in range(4):
+        estimate = round(float(rng.normal(1.5, 0.5)), 2)
+        actual = round(estimate * float(rng.normal(1.02, 0.05)), 2)
+        results.append({
+            "symbol": symbol.upper(),
+            "period": (date(date.today().year, 1, 1) - timedelta(days=91 * i)).isoformat(),
+            "estimate": estimate,
+            "actual": actual,
+            "surprisePercent": round((actual / estimate - 1) * 100, 2) if estimate else None,
+        })
+    return results
+
+
+class QueryRequest(BaseModel):
+    user_query: str
+    retrieved_docs: list[str]
+    priority: int = 0
+    deadline_seconds: Optional[float] = None
+    max_age_seconds: Optional[float] = None
+
+
+def _tokens(query: str) -> list[str]:
+    words = f"Based on the retrieved data, here is a summary for: {query}.".split()
+    filler = ["The", "stock", "moved", "in", "line", "with", "the", "market."]
+    words += [filler[i % len(filler)] for i in range(max(LLM_TOKENS - len(words), 0))]
+    return [(" " if i else "") + word for i, word in enumerate(words[:LLM_TOKENS])]
+
+
+def sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@llm_app.get("/health")
+@llm_app.get("/ready")
+async def ready():
+    return {"status": "ready"}
+
+
+@llm_app.post("/generate/")
+async def generate(req: QueryRequest):
+    tokens = _tokens(req.user_query)
+    await asyncio.sleep((LLM_FIRST_TOKEN_MS + LLM_TOKEN_MS * len(tokens)) / 1000)
+    return {"response": "".join(tokens)}
+
+
+@llm_app.post("/generate/stream")
+async def generate_stream(req: QueryRequest):
+    tokens = _tokens(req.user_query)
+
+    async def events():
+        await asyncio.sleep(LLM_FIRST_TOKEN_MS / 1000)
+        for token in tokens:
+            yield sse_event({"token": token})
+            await asyncio.sleep(LLM_TOKEN_MS / 1000)
+        yield sse_event({"done": True, "response": "".join(tokens)})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("server", choices=["market", "llm"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="defaults to 8090 (market) or 8005 (llm)")
+    args = parser.parse_args()
+    app = market_app if args.server == "market" else llm_app
+    uvicorn.run(app, host=args.host, port=args.port or (8090 if args.server == "market" else 8005), log_level="warning")
@@ -0,0 +1,57 @@
+"""Drop-in for the parts of yfinance the agents use, backed by ``benchmarks.stub_servers market``.
+
+Put this directory first on PYTHONPATH (``PYTHONPATH=benchmarks/stubs``) when starting
+api_agent or scraper so ``import yfinance`` resolves here instead of to Yahoo Finance.
+"""
+import os
+
+import pandas as pd
+import requests
+
+STUB_MARKET_URL = os.getenv("STUB_MARKET_URL", "http://127.0.0.1:8090")
+
+_session = requests.Session()
+
+
+def _get(path: str, **params):
+    response = _session.get(f"{STUB_MARKET_URL}{path}", params=params, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+class Ticker:
+    def __init__(self, ticker: str):
+        self.ticker = ticker.upper()
+
+    @property
+    def info(self) -> dict:
+        return _get(f"/info/{self.ticker}")
+
+    @property
+    def quarterly_income_stmt(self) -> pd.DataFrame:
+        data = _get(f"/income/{self.ticker}")
+        return pd.DataFrame([data["net_income"]], index=["Net Income"], columns=pd.to_datetime(data["dates"]))
+
+    def history(self, start=None, end=None, **kwargs) -> pd.DataFrame:
+        return download([self.ticker], start=start, end=end)[self.ticker]
+
+
+def download(tickers, start=None, end=None, **kwargs) -> pd.DataFrame:
+    """Daily bars with (ticker, field) columns, the ``group_by="ticker"`` layout."""
+    if isinstance(tickers, str):
+        tickers = tickers.replace(",", " ").split()
+    params = {"tickers": ",".join(t.upper() for t in tickers)}
+    if start:
+        params["start"] = str(start)
+    if end:
+        params["end"] = str(end)
+    frames = {}
+    for ticker, cols in _get("/download", **params).items():
+        frames[ticker] = pd.DataFrame(
+            {"Open": cols["open"], "High": cols["high"], "Low": cols["low"], "Close": cols["close"],
+             "Adj Close": cols["close"], "Volume": cols["volume"]},
+            index=pd.DatetimeIndex(pd.to_datetime(cols["date"]), name="Date"),
+        )
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, axis=1)
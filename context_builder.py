@@ -0,0 +1,164 @@
+import json
+import math
+import os
+import re
+
+import numpy as np
+
+# Upper bound for the documents section of the LLM prompt. The LLM agent lowers it further so
+# the prompt template, the question and MAX_TOKENS of answer still fit the model's window.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# digits are matched one at a time: Llama/Mistral SentencePiece vocabularies split numbers per digit
+_TOKEN_PATTERN = re.compile(r"\d|[^\W\d]+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count estimate: one per digit and punctuation mark, one per four characters of a word."""
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _TOKEN_PATTERN.findall(text))
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    if estimate_tokens(text) <= budget:
+        return text
+    budget -= 3  # room for the " ..." marker
+    if budget <= 0:
+        return ""
+    used, end = 0, 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        cost = max(1, math.ceil(len(match.group()) / 4))
+        if used + cost > budget:
+            break
+        used += cost
+        end = match.end()
+    return text[:end].rstrip() + " ..."
+
+
+def fit_documents(docs: list[str], budget: int = CONTEXT_TOKEN_BUDGET) -> list[str]:
+    """Keeps documents in order until the budget is spent, truncating the one that crosses it."""
+    fitted, remaining = [], budget
+    for doc in docs:
+        cost = estimate_tokens(doc)
+        if cost <= remaining:
+            fitted.append(doc)
+            remaining -= cost
+            continue
+        truncated = truncate_to_tokens(doc, remaining)
+        if truncated:
+            fitted.append(truncated)
+        break
+    return fitted
+
+
+def _number(value, digits=2):
+    if value is None or value == "N/A":
+        return "n/a"
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    for limit, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M")):
+        if abs(value) >= limit:
+            return f"{value / limit:.{digits}f}{suffix}"
+    return f"{value:.{digits}f}"
+
+
+def _change(new, old):
+    try:
+        return f"{(float(new) / float(old) - 1) * 100:+.2f}%"
+    except (TypeError, ValueError, ZeroDivisionError):
+        return "n/a"
+
+
+def summarize_price(ticker: str, response: dict) -> str:
+    data = response.get("data", {})
+    return (
+        f"{ticker} quote: price {_number(data.get('current_price'))} "
+        f"(previous close {_number(data.get('previous_close'))}, "
+        f"{_change(data.get('current_price'), data.get('previous_close'))}), "
+        f"day range {_number(data.get('day_low'))}-{_number(data.get('day_high'))}, "
+        f"volume {_number(data.get('volume'), 1)}"
+        + (f", market cap {_number(data['market_cap'])}" if data.get("market_cap") else "")
+        + "."
+    )
+
+
+def summarize_earnings(ticker: str, response: dict) -> str:
+    lines = []
+    api = response.get("api_earnings", {})
+    data = api.get("data", {}) if isinstance(api, dict) else {}
+    if "error" in api or "detail" in api:
+        lines.append(f"{ticker} earnings: unavailable ({api.get('error') or api.get('detail')}).")
+    elif "message" in data:
+        lines.append(f"{ticker} earnings: {data['message']}")
+    else:
+        lines.append(
+            f"{ticker} latest earnings (period {data.get('date', 'n/a')}): EPS {_number(data.get('epsActual'))} "
+            f"vs estimate {_number(data.get('epsEstimate'))}, surprise {_number(data.get('surprisePercent'))}%."
+        )
+    scraping = response.get("scraping", {})
+    if isinstance(scraping, dict) and scraping.get("summaries"):
+        lines.extend(scraping["summaries"])
+    return "\n".join(lines)
+
+
+def _history_columns(data):
+    """Columnar dict from either the batch (columnar) or /historical (row list) layout."""
+    if isinstance(data, list):
+        if not data:
+            return {}
+        return {key: [row.get(key) for row in data] for key in data[0]}
+    return data or {}
+
+
+def summarize_historical(ticker: str, response: dict) -> str:
+    cols = _history_columns(response.get("data"))
+    if not cols.get("date"):
+        return f"{ticker} history: {response.get('message', 'no bars in range.')}"
+    close = np.asarray(cols["close"], dtype="float64")
+    returns = np.diff(close) / close[:-1] if len(close) > 1 else np.empty(0)
+    return (
+        f"{ticker} daily bars {cols['date'][0]} to {cols['date'][-1]} ({len(close)} sessions): "
+        f"open {_number(cols['open'][0])}, close {_number(close[-1])} ({_change(close[-1], cols['open'][0])}), "
+        f"high {_number(np.max(cols['high']))}, low {_number(np.min(cols['low']))}, "
+        f"average volume {_number(np.mean(cols['volume']), 1)}"
+        + (f", daily volatility {np.std(returns) * 100:.2f}%" if len(returns) > 1 else "")
+        + "."
+    )
+
+
+SUMMARIZERS = {"price": summarize_price, "earnings": summarize_earnings, "historical": summarize_historical}
+
+
+def summarize(ticker: str, intent: str, response) -> str:
+    """One compact, human-readable block per ticker, shaped by the intent that fetched it."""
+    if not isinstance(response, dict):
+        return f"{ticker}: no data."
+    if "error" in response or "detail" in response:
+        return f"{ticker}: data unavailable ({response.get('error') or response.get('detail')})."
+    summarizer = SUMMARIZERS.get(intent)
+    try:
+        if summarizer is not None:
+            return summarizer(ticker, response)
+    except (KeyError, IndexError, TypeError, ValueError):
+        pass
+    return f"{ticker} info: {json.dumps(response, separators=(',', ':'), default=str)}"
+
+
+def build_context(agent_data: dict, ticker_intent_map: dict, budget: int = CONTEXT_TOKEN_BUDGET):
+    """Prompt context for all tickers within ``budget`` tokens, and the token accounting for it.
+
+    ``raw_tokens`` is what the previous ``str(response)`` rendering would have cost.
+    """
+    sections = [summarize(ticker, intent, agent_data.get(ticker)) for ticker, intent in ticker_intent_map.items()]
+    fitted = fit_documents(sections, budget)
+    context = "\n\n".join(fitted)
+    raw_tokens = sum(estimate_tokens(f"{ticker} info:\n{agent_data.get(ticker)}") for ticker in ticker_intent_map)
+    context_tokens = estimate_tokens(context)
+    return context, {
+        "raw_tokens": raw_tokens,
+        "context_tokens": context_tokens,
+        "tokens_saved": raw_tokens - context_tokens,
+        "budget": budget,
+        "truncated": fitted != sections,
+    }
@@ -0,0 +1,240 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional
+
+import numpy as np
+
+import telemetry
+
+# Embedding cache and micro-batching settings
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "50000"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH")  # unset disables on-disk persistence
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_ENCODE_BATCH_SIZE = int(os.getenv("EMBED_ENCODE_BATCH_SIZE", "0"))  # 0 runs each merged batch as one forward pass
+
+# Embedding model and CPU inference backend
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 keeps the runtime's default
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")  # onnx_int8 export to load
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_embedding_model(name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND, threads: int = EMBEDDING_THREADS):
+    """SentenceTransformer running on the chosen backend.
+
+    ``torch_int8`` applies dynamic int8 quantization to the Linear layers (CPU only). The
+    ONNX backends need sentence-transformers>=3.2 with optimum[onnxruntime]; ``onnx_int8``
+    loads the pre-quantized export named by EMBEDDING_ONNX_FILE from the model repository.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}.")
+    from sentence_transformers import SentenceTransformer
+
+    if backend.startswith("onnx"):
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if threads:
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = threads
+            model_kwargs["session_options"] = options
+        if backend == "onnx_int8":
+            model_kwargs["file_name"] = EMBEDDING_ONNX_FILE
+        return SentenceTransformer(name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+    if backend == "torch":
+        return SentenceTransformer(name)
+    model = SentenceTransformer(name, device="cpu")
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class EmbeddingCache:
+    """Thread-safe LRU map from content hash to embedding vector."""
+
+    def __init__(self, max_size: int = EMBED_CACHE_SIZE, path: Optional[str] = EMBED_CACHE_PATH):
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self):
+        if not self.path or not os.path.isfile(self.path):
+            return
+        with np.load(self.path) as saved:
+            # vectors from another backend are close but not identical; do not mix them into the index
+            backend = str(saved["backend"]) if "backend" in saved else "torch"
+            if backend != EMBEDDING_BACKEND:
+                print(f"Ignoring embedding cache written by the {backend} backend.")
+                return
+            for key, vector in zip(saved["keys"], saved["vectors"]):
+                self.put(str(key), vector)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._entries:
+                return
+            keys = np.array(list(self._entries.keys()))
+            vectors = np.stack(list(self._entries.values()))
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, keys=keys, vectors=vectors, backend=EMBEDDING_BACKEND)
+        os.replace(tmp_path, self.path)
+
+    def stats(self):
+        return {"size": len(self), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+embed_batch_size = telemetry.summary("embed_batch_size", "Texts per model encode call.")
+embed_batch_seconds = telemetry.summary("embed_batch_seconds", "Model encode time per batch.")
+
+
+class BatchingEncoder:
+    """Merges concurrent encode calls arriving within a short window into one model forward pass."""
+
+    def __init__(self, model, window_ms: float = EMBED_BATCH_WINDOW_MS, max_batch: int = EMBED_MAX_BATCH,
+                 encode_batch_size: int = EMBED_ENCODE_BATCH_SIZE):
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.encode_batch_size = encode_batch_size
+        self.batches = 0
+        self.batched_texts = 0
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        if self._thread is None:
+            return self.model.encode(texts, convert_to_numpy=True, batch_size=self.encode_batch_size or 32)
+        future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            pending = [item]
+            count = len(item[0])
+            try:
+                while count < self.max_batch:
+                    nxt = self._queue.get(timeout=self.window)
+                    if nxt is None:
+                        self._queue.put(None)
+                        break
+                    pending.append(nxt)
+                    count += len(nxt[0])
+            except queue.Empty:
+                pass
+            self._encode_batch(pending)
+
+    def _encode_batch(self, pending):
+        texts = [text for batch, _ in pending for text in batch]
+        start = time.perf_counter()
+        try:
+            batch_size = self.encode_batch_size or max(len(texts), 1)
+            embeddings = self.model.encode(texts, convert_to_numpy=True, batch_size=batch_size)
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        embed_batch_seconds.observe(time.perf_counter() - start)
+        embed_batch_size.observe(len(texts))
+        self.batches += 1
+        self.batched_texts += len(texts)
+        offset = 0
+        for batch, future in pending:
+            future.set_result(embeddings[offset:offset + len(batch)])
+            offset += len(batch)
+
+
+class Embedder:
+    """Cache-first text encoder; only unseen (and de-duplicated) texts reach the model."""
+
+    def __init__(self, model, cache: Optional[EmbeddingCache] = None):
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.batcher = BatchingEncoder(model)
+
+    def start(self):
+        self.cache.load()
+        self.batcher.start()
+
+    def stop(self):
+        self.batcher.stop()
+        self.cache.save()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype="float32")
+        keys = [content_hash(text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            encoded = self.batcher.encode(list(missing.values()))
+            for key, vector in zip(missing, encoded):
+                self.cache.put(key, vector)
+            fresh = dict(zip(missing, encoded))
+            vectors = [fresh[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return np.asarray(np.stack(vectors), dtype="float32")
+
+    def stats(self):
+        return {
+            "backend": EMBEDDING_BACKEND,
+            "threads": EMBEDDING_THREADS or None,
+            "encode_batch_size": self.batcher.encode_batch_size or None,
+            "cache": self.cache.stats(),
+            "batches": self.batcher.batches,
+            "batched_texts": self.batcher.batched_texts,
+        }
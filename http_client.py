@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import telemetry
+
+# Shared inter-agent HTTP settings
+MAX_CONNECTIONS = int(os.getenv("AGENT_HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("AGENT_HTTP_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("AGENT_HTTP_KEEPALIVE_EXPIRY", "30"))
+DEFAULT_TIMEOUT = float(os.getenv("AGENT_HTTP_TIMEOUT", "30"))
+RETRIES = int(os.getenv("AGENT_HTTP_RETRIES", "3"))
+BACKOFF = float(os.getenv("AGENT_HTTP_BACKOFF", "0.2"))
+
+RETRY_STATUSES = (502, 503, 504)
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+# Trace IDs are only forwarded to the other agents, never to third-party APIs
+LOCAL_HOSTS = frozenset(["127.0.0.1", "localhost"])
+
+_async_client: Optional[httpx.AsyncClient] = None
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """Retries connection failures (any method) and gateway errors (idempotent methods) with backoff."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, retries: int = RETRIES, backoff: float = BACKOFF):
+        self.transport = transport
+        self.retries = retries
+        self.backoff = backoff
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await self.transport.handle_async_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if attempt >= self.retries:
+                    raise
+            else:
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or request.method not in IDEMPOTENT_METHODS
+                    or attempt >= self.retries
+                ):
+                    return response
+                await response.aclose()
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def _call_span_name(host: str, port) -> str:
+    return f"call:{host}:{port}" if port else f"call:{host}"
+
+
+async def _inject_trace(request: httpx.Request):
+    trace_id = telemetry.current_trace_id()
+    if trace_id and request.url.host in LOCAL_HOSTS:
+        request.headers[telemetry.TRACE_HEADER] = trace_id
+    request.extensions["telemetry_start"] = time.perf_counter()
+
+
+async def _record_call(response: httpx.Response):
+    request = response.request
+    start = request.extensions.get("telemetry_start")
+    if start is not None:
+        telemetry.record_span(_call_span_name(request.url.host, request.url.port), time.perf_counter() - start,
+                              method=request.method, status=response.status_code)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies DEFAULT_TIMEOUT when the caller does not pass one, forwards the
+    current trace ID to other agents and records each call as a span.
+    """
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = DEFAULT_TIMEOUT
+        url = httpx.URL(request.url)
+        trace_id = telemetry.current_trace_id()
+        if trace_id and url.host in LOCAL_HOSTS:
+            request.headers[telemetry.TRACE_HEADER] = trace_id
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        telemetry.record_span(_call_span_name(url.host, url.port), time.perf_counter() - start,
+                              method=request.method, status=response.status_code)
+        return response
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Returns the process-wide pooled async client, creating it on first use."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        limits = httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+        transport = RetryTransport(httpx.AsyncHTTPTransport(limits=limits))
+        _async_client = httpx.AsyncClient(
+            transport=transport,
+            timeout=DEFAULT_TIMEOUT,
+            event_hooks={"request": [_inject_trace], "response": [_record_call]},
+        )
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def get_session() -> requests.Session:
+    """Returns the process-wide pooled requests session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=RETRIES,
+                backoff_factor=BACKOFF,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=IDEMPOTENT_METHODS,
+                raise_on_status=False,
+            )
+            adapter = TimeoutHTTPAdapter(pool_connections=MAX_KEEPALIVE, pool_maxsize=MAX_CONNECTIONS, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def parse_sse_line(line: str):
+    """Decodes one ``data: {...}`` server-sent-events line; other lines return None."""
+    if not line.startswith("data:"):
+        return None
+    return json.loads(line[5:].strip())
+
+
+def iter_sse(response: requests.Response):
+    """Yields the JSON payload of each event in a streaming requests response."""
+    for line in response.iter_lines(decode_unicode=True):
+        event = parse_sse_line(line or "")
+        if event is not None:
+            yield event
+
+
+async def aiter_sse(response: httpx.Response):
+    """Async variant of ``iter_sse`` for a streaming httpx response."""
+    async for line in response.aiter_lines():
+        event = parse_sse_line(line)
+        if event is not None:
+            yield event
@@ -0,0 +1,206 @@
+import contextvars
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+import telemetry
+
+# Generation scheduling settings
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "1"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "16"))
+LLM_DEFAULT_DEADLINE = float(os.getenv("LLM_DEFAULT_DEADLINE", "300"))
+
+llm_tokens_total = telemetry.counter("llm_tokens_total", "Tokens generated, by outcome.")
+llm_tokens_per_second = telemetry.summary("llm_tokens_per_second", "Decode throughput per generation.")
+llm_time_to_first_token = telemetry.summary("llm_time_to_first_token_seconds", "Prompt processing time until the first token.")
+llm_queue_wait = telemetry.summary("llm_queue_wait_seconds", "Time a job spent queued before a worker took it.")
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Generation queue is full; retry after {retry_after:.0f}s.")
+        self.retry_after = retry_after
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class GenerationJob:
+    """One queued generation; ``on_token`` receives streamed tokens from the worker thread."""
+
+    def __init__(self, prompt: str, params: dict, priority: int, deadline: float, on_token: Optional[Callable] = None):
+        self.prompt = prompt
+        self.params = params
+        self.priority = priority
+        self.deadline = deadline
+        self.on_token = on_token
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.context = contextvars.copy_context()  # trace ID of the submitting request
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+
+class GenerationScheduler:
+    """Bounded priority queue in front of a pool of worker threads, each owning its own model instance.
+
+    Higher ``priority`` runs first, then FIFO. Jobs are dropped when cancelled (abandoned
+    request) or when their deadline passes, both while queued and between streamed tokens.
+    """
+
+    def __init__(self, model_factory: Callable, workers: int = LLM_WORKERS, max_queue: int = LLM_QUEUE_SIZE):
+        self.model_factory = model_factory
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue = queue.PriorityQueue(maxsize=max_queue)
+        self._sequence = itertools.count()
+        self._threads = []
+        self._busy = 0
+        self._lock = threading.Lock()
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "cancelled": 0, "expired": 0}
+        self._wait_times = deque(maxlen=500)
+        self._service_times = deque(maxlen=500)
+
+    def start(self, preload: bool = True):
+        """Starts the workers; without ``preload`` each loads its model when it takes its first job."""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(i, preload), name=f"llm-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put((float("-inf"), next(self._sequence), None))
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def retry_after(self) -> float:
+        service = sum(self._service_times) / len(self._service_times) if self._service_times else 30.0
+        return max(1.0, service * (self._queue.qsize() + self._busy) / max(self.workers, 1))
+
+    def submit(self, prompt: str, params: dict, priority: int = 0, deadline_seconds: Optional[float] = None,
+               on_token: Optional[Callable] = None) -> GenerationJob:
+        deadline = time.monotonic() + (deadline_seconds or LLM_DEFAULT_DEADLINE)
+        job = GenerationJob(prompt, params, priority, deadline, on_token)
+        try:
+            self._queue.put_nowait((-priority, next(self._sequence), job))
+        except queue.Full:
+            with self._lock:
+                self.counters["rejected"] += 1
+            raise QueueFull(self.retry_after())
+        with self._lock:
+            self.counters["submitted"] += 1
+        return job
+
+    def _finish(self, job, counter, result=None, error=None):
+        with self._lock:
+            self.counters[counter] += 1
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    def _run(self, worker_id: int, preload: bool):
+        model, load_error = None, None
+
+        def ensure_model():
+            nonlocal model, load_error
+            if model is None and load_error is None:
+                try:
+                    model = self.model_factory(worker_id)
+                except Exception as e:
+                    load_error = e
+            return model
+
+        if preload:
+            ensure_model()
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            if ensure_model() is None:
+                self._finish(job, "failed", error=load_error)
+                continue
+            now = time.monotonic()
+            self._wait_times.append(now - job.enqueued_at)
+            llm_queue_wait.observe(now - job.enqueued_at)
+            if job.cancelled:
+                self._finish(job, "cancelled", error=JobCancelled("Request was abandoned before generation started."))
+                continue
+            if now > job.deadline:
+                self._finish(job, "expired", error=DeadlineExceeded("Deadline passed while queued."))
+                continue
+            with self._lock:
+                self._busy += 1
+            try:
+                job.context.run(self._generate, model, job)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                self._service_times.append(time.monotonic() - now)
+
+    def _generate(self, model, job):
+        """Always decodes in streaming mode so tokens can be counted and deadlines checked per token."""
+        parts = []
+        outcome = "failed"
+        start = time.perf_counter()
+        first_token = None
+        try:
+            for token in model.generate(job.prompt, streaming=True, **job.params):
+                if job.cancelled:
+                    outcome = "cancelled"
+                    self._finish(job, "cancelled", error=JobCancelled("Request was abandoned during generation."))
+                    return
+                if time.monotonic() > job.deadline:
+                    outcome = "expired"
+                    self._finish(job, "expired", error=DeadlineExceeded("Deadline passed during generation."))
+                    return
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    llm_time_to_first_token.observe(first_token - start)
+                parts.append(token)
+                if job.on_token is not None:
+                    job.on_token(token)
+            outcome = "completed"
+            self._finish(job, "completed", result="".join(parts))
+        except Exception as e:
+            self._finish(job, "failed", error=e)
+        finally:
+            elapsed = time.perf_counter() - start
+            telemetry.record_span("generate", elapsed, tokens=len(parts), outcome=outcome)
+            llm_tokens_total.inc(len(parts), outcome=outcome)
+            if first_token is not None and len(parts) > 1:
+                llm_tokens_per_second.observe((len(parts) - 1) / max(time.perf_counter() - first_token, 1e-9))
+
+    def metrics(self):
+        waits = sorted(self._wait_times)
+        with self._lock:
+            counters = dict(self.counters)
+            busy = self._busy
+        return {
+            "workers": self.workers,
+            "busy_workers": busy,
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "wait_seconds_avg": round(sum(waits) / len(waits), 3) if waits else None,
+            "wait_seconds_p95": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else None,
+            "service_seconds_avg": round(sum(self._service_times) / len(self._service_times), 3) if self._service_times else None,
+            **counters,
+        }
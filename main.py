@@ -1,159 +1,544 @@
-import re
-import httpx
-import spacy
-from fastapi import FastAPI
-from pydantic import BaseModel
-
-app = FastAPI()
-
-# Agent URLs
-API_AGENT_URL = "http://127.0.0.1:8002"
-SCRAPING_AGENT_URL = "http://127.0.0.1:8003"
-RETRIEVER_AGENT_URL = "http://127.0.0.1:8004"
-LLM_AGENT_URL = "http://127.0.0.1:8005"
-
-nlp = spacy.load("en_core_web_sm")
-
-class TranscriptionRequest(BaseModel):
-    transcription: str
-
-# Ticker pattern (1–5 uppercase letters)
-TICKER_REGEX = r'\b[A-Z]{1,5}\b'
-
-# Intent keywords map
-INTENT_KEYWORDS = {
-    "earnings": ["earnings", "earnings report", "report"],
-    "historical": ["history", "historical", "past", "previous"],
-    "price": ["price", "stock", "quote", "current price"]
-}
-
-
-def extract_tickers(text):
-    return re.findall(TICKER_REGEX, text)
-
-
-def find_intent_for_phrase(phrase: str):
-    phrase = phrase.lower()
-    for intent, keywords in INTENT_KEYWORDS.items():
-        if any(kw in phrase for kw in keywords):
-            return intent
-    return "price"  # Default intent
-
-
-def parse_query(user_text: str):
-    doc = nlp(user_text)
-    chunks = []
-    current_chunk = []
-
-    for token in doc:
-        if token.text.lower() == "and":
-            if current_chunk:
-                chunks.append(" ".join([t.text for t in current_chunk]))
-                current_chunk = []
-        else:
-            current_chunk.append(token)
-
-    if current_chunk:
-        chunks.append(" ".join([t.text for t in current_chunk]))
-
-    ticker_intent_map = {}
-    for chunk in chunks:
-        tickers = extract_tickers(chunk)
-        if not tickers:
-            continue
-        intent = find_intent_for_phrase(chunk)
-        for t in tickers:
-            ticker_intent_map[t] = intent
-
-    return ticker_intent_map
-
-
-async def fetch_data_for_ticker(client, ticker: str, intent: str):
-    if intent == "price":
-        api_resp = await client.get(f"{API_AGENT_URL}/marketdata/{ticker}")
-        return api_resp.json()
-
-    elif intent == "earnings":
-        api_resp = await client.get(f"{API_AGENT_URL}/earnings/{ticker}")
-        scraping_resp = await client.post(f"{SCRAPING_AGENT_URL}/push_scraped_data/{ticker}")
-        return {
-            "api_earnings": api_resp.json(),
-            "scraping": scraping_resp.json()
-        }
-
-    elif intent == "historical":
-        api_resp = await client.get(f"{API_AGENT_URL}/historical/{ticker}?start=2025-04-01&end=2025-05-01")
-        return api_resp.json()
-
-    return {}
-
-
-def build_context(agent_data, ticker):
-    """Builds a plain string context from agent data per ticker."""
-    context = f"{ticker} info:\n"
-    context += str(agent_data.get(ticker))
-    return context
-
-
-@app.post("/receive_transcription")
-async def receive_transcription(data: TranscriptionRequest):
-    user_text = data.transcription
-    print("Received transcription:", user_text)
-
-    ticker_intent_map = parse_query(user_text)
-    print("Parsed ticker-intent map:", ticker_intent_map)
-
-    responses = {}
-    documents_to_add = []
-
-    async with httpx.AsyncClient() as client:
-        # Step 1: Fetch data and push to retriever
-        for ticker, intent in ticker_intent_map.items():
-            data = await fetch_data_for_ticker(client, ticker, intent)
-            responses[ticker] = data
-            documents_to_add.append(str(data))
-
-        if documents_to_add:
-            add_docs_resp = await client.post(
-                f"{RETRIEVER_AGENT_URL}/add_documents",
-                json={"docs": documents_to_add}
-            )
-            print("Retriever add_documents response:", add_docs_resp.text)
-
-        # Step 2: Query retriever
-        retriever_payload = {
-            "query": user_text,
-            "top_k": 1
-        }
-        retriever_query_resp = await client.post(
-            f"{RETRIEVER_AGENT_URL}/query",
-            json=retriever_payload
-        )
-        retriever_result = retriever_query_resp.json() if retriever_query_resp.status_code == 200 else {"error": retriever_query_resp.text}
-
-        # Step 3: Build full context for LLM
-        full_context = "\n\n".join([build_context(responses, ticker) for ticker in ticker_intent_map])
-
-        llm_payload = {
-            "user_query": user_text,
-            "retrieved_docs": [full_context]
-        }
-
-        # Step 4: Call LLM agent
-        llm_response = await client.post(f"{LLM_AGENT_URL}/generate/", json=llm_payload, timeout=300.0)
-        llm_result = llm_response.json() if llm_response.status_code == 200 else {"error": llm_response.text}
-        # Send the LLM response to TTS agent
-        tts_text = llm_result.get("response", "Sorry, I don't have an answer.")
-        tts_payload = {"text": tts_text}
-
-        tts_response = await client.post("http://127.0.0.1:8006/speak", json=tts_payload)
-        tts_result = tts_response.json() if tts_response.status_code == 200 else {"error": tts_response.text}
-
-
-    return {
-        "user_query": user_text,
-        "ticker_intent_map": ticker_intent_map,
-        "agent_data": responses,
-        "retriever_result": retriever_result,
-        "llm_response": llm_result
-    }
+import asyncio
+import json
+import os
+import re
+import time
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Optional
+
+import http_client
+import telemetry
+from model_lifecycle import LazyModel, add_lifecycle_routes
+from query_parser import QueryParser, load_tickers
+from context_builder import build_context
+from market_cache import EARNINGS_TTL, OPEN_HISTORY_TTL, QUOTE_TTL
+from sentences import split_sentences
+
+app = FastAPI()
+telemetry.instrument(app, "orchestrator")
+
+# Agent URLs
+API_AGENT_URL = "http://127.0.0.1:8002"
+SCRAPING_AGENT_URL = "http://127.0.0.1:8003"
+RETRIEVER_AGENT_URL = "http://127.0.0.1:8004"
+LLM_AGENT_URL = "http://127.0.0.1:8005"
+TTS_AGENT_URL = "http://127.0.0.1:8006"
+
+# Fan-out limits for the per-ticker fetch stage
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))
+
+# Overlap indexing/retrieval with generation and speak the answer sentence by sentence
+PIPELINED_ORCHESTRATION = os.getenv("PIPELINED_ORCHESTRATION", "1") == "1"
+NO_ANSWER = "Sorry, I don't have an answer."
+
+# How long an answer built from each intent's data stays valid in the LLM response cache
+INTENT_MAX_AGE = {"price": QUOTE_TTL, "earnings": EARNINGS_TTL, "historical": OPEN_HISTORY_TTL}
+
+
+def load_spacy():
+    import spacy
+    return spacy.load("en_core_web_sm")
+
+
+# spaCy is only loaded when the query parser meets a capitalised word it cannot classify
+nlp = LazyModel("en_core_web_sm", load_spacy)
+query_parser = QueryParser(load_tickers(), nlp=nlp)
+add_lifecycle_routes(app)
+
+@app.on_event("startup")
+async def startup_event():
+    http_client.get_async_client()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await http_client.close_async_client()
+
+
+class TranscriptionRequest(BaseModel):
+    transcription: str
+    pipelined: Optional[bool] = None  # defaults to PIPELINED_ORCHESTRATION
+    speak: bool = True  # send the answer to the TTS agent
+
+def parse_query(user_text: str):
+    return query_parser.parse(user_text)
+
+
+@app.get("/parser_stats")
+async def parser_stats():
+    return query_parser.stats(spacy_state=nlp.state)
+
+
+async def call_agent(client, semaphore, method: str, url: str, timeout: float = FETCH_TIMEOUT):
+    """Calls an upstream agent under the fan-out limit, returning an error dict instead of raising."""
+    async with semaphore:
+        try:
+            resp = await asyncio.wait_for(client.request(method, url), timeout)
+            return resp.json()
+        except asyncio.TimeoutError:
+            return {"error": f"Timed out after {timeout}s: {url}"}
+        except Exception as e:
+            return {"error": str(e)}
+
+
+async def fetch_data_for_ticker(client, semaphore, ticker: str, intent: str):
+    if intent == "price":
+        return await call_agent(client, semaphore, "GET", f"{API_AGENT_URL}/marketdata/{ticker}")
+
+    elif intent == "earnings":
+        api_data, scraping_data = await asyncio.gather(
+            call_agent(client, semaphore, "GET", f"{API_AGENT_URL}/earnings/{ticker}"),
+            call_agent(client, semaphore, "POST", f"{SCRAPING_AGENT_URL}/push_scraped_data/{ticker}"),
+        )
+        return {
+            "api_earnings": api_data,
+            "scraping": scraping_data
+        }
+
+    elif intent == "historical":
+        return await call_agent(
+            client, semaphore, "GET", f"{API_AGENT_URL}/historical/{ticker}?start=2025-04-01&end=2025-05-01"
+        )
+
+    return {}
+
+
+async def fetch_price_batch(client, semaphore, tickers):
+    """Quotes for all price-intent tickers in one round trip, reshaped to the per-ticker /marketdata form."""
+    result = await call_agent(client, semaphore, "GET", f"{API_AGENT_URL}/batch/marketdata?tickers={','.join(tickers)}")
+    if "columns" not in result:
+        return {ticker: result for ticker in tickers}
+    columns = result["columns"]
+    data = {
+        ticker: {"data": dict({"ticker": ticker}, **{field: values[i] for field, values in columns.items()})}
+        for i, ticker in enumerate(result["tickers"])
+    }
+    for ticker in tickers:
+        data.setdefault(ticker, {"error": f"No market data available for '{ticker}'."})
+    return data
+
+
+async def fetch_historical_batch(client, semaphore, tickers):
+    """Bars for all historical-intent tickers in one round trip, columnar per ticker."""
+    result = await call_agent(
+        client, semaphore, "GET",
+        f"{API_AGENT_URL}/batch/historical?tickers={','.join(tickers)}&start=2025-04-01&end=2025-05-01"
+    )
+    if "data" not in result:
+        return {ticker: result for ticker in tickers}
+    data = {}
+    for ticker in tickers:
+        if ticker in result["data"]:
+            data[ticker] = {"ticker": ticker, "data": result["data"][ticker]}
+        else:
+            data[ticker] = {"ticker": ticker, "data": {}, "message": "No historical data found."}
+    return data
+
+
+async def _single(ticker, coro):
+    return {ticker: await coro}
+
+
+async def fetch_all_tickers(client, ticker_intent_map):
+    """Fetches every ticker concurrently; slow or failing tickers yield partial results.
+
+    Price and historical tickers are grouped into one batch call each; earnings (and any
+    other intent) are fetched per ticker.
+    """
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+    ticker_timings = {}
+    by_intent = {}
+    for ticker, intent in ticker_intent_map.items():
+        by_intent.setdefault(intent, []).append(ticker)
+
+    async def timed(tickers, coro):
+        start = time.perf_counter()
+        data = await coro
+        elapsed = round((time.perf_counter() - start) * 1000, 1)
+        for ticker in tickers:
+            ticker_timings[ticker] = elapsed
+        return data
+
+    batch_fetchers = {"price": fetch_price_batch, "historical": fetch_historical_batch}
+    tasks = []
+    for intent, tickers in by_intent.items():
+        if intent in batch_fetchers:
+            tasks.append(timed(tickers, batch_fetchers[intent](client, semaphore, tickers)))
+        else:
+            for ticker in tickers:
+                tasks.append(timed([ticker], _single(ticker, fetch_data_for_ticker(client, semaphore, ticker, intent))))
+
+    responses = {}
+    for data in await asyncio.gather(*tasks):
+        responses.update(data)
+    return {ticker: responses[ticker] for ticker in ticker_intent_map}, ticker_timings
+
+
+class StageTimer:
+    """Collects per-stage wall-clock milliseconds for the response's ``timings`` block."""
+
+    def __init__(self):
+        self.timings = {}
+        self.request_start = self.stage_start = time.perf_counter()
+
+    def end_stage(self, name):
+        now = time.perf_counter()
+        self.timings[name] = round((now - self.stage_start) * 1000, 1)
+        telemetry.record_span(name.removesuffix("_ms"), now - self.stage_start)
+        self.stage_start = now
+
+    def mark(self, name):
+        """Records time since the request started, without closing the current stage."""
+        self.timings[name] = round((time.perf_counter() - self.request_start) * 1000, 1)
+
+    def finish(self):
+        self.mark("total_ms")
+        return self.timings
+
+
+def sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload, default=str)}\n\n"
+
+
+# Background tasks (TTS hand-offs) that must stay referenced until they finish
+background_tasks = set()
+
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+async def parse_and_fetch(client, user_text: str, timer: StageTimer):
+    # the parser may load or run spaCy for an ambiguous symbol, so keep it off the event loop
+    ticker_intent_map = await asyncio.to_thread(parse_query, user_text)
+    print("Parsed ticker-intent map:", ticker_intent_map)
+    timer.end_stage("parse_ms")
+
+    # Fetch data for all tickers concurrently
+    responses, ticker_timings = await fetch_all_tickers(client, ticker_intent_map)
+    timer.timings["fetch_per_ticker_ms"] = ticker_timings
+    timer.end_stage("fetch_ms")
+    return ticker_intent_map, responses
+
+
+async def index_documents(client, responses):
+    documents_to_add = [str(data) for data in responses.values()]
+    if documents_to_add:
+        add_docs_resp = await client.post(
+            f"{RETRIEVER_AGENT_URL}/add_documents",
+            json={
+                "docs": documents_to_add,
+                "metadata": [{"ticker": ticker, "source": "orchestrator"} for ticker in responses]
+            }
+        )
+        print("Retriever add_documents response:", add_docs_resp.text)
+
+
+async def retrieve(client, user_text: str, ticker_intent_map):
+    retriever_payload = {
+        "query": user_text,
+        "top_k": 1,
+        "tickers": list(ticker_intent_map) or None
+    }
+    try:
+        retriever_query_resp = await client.post(f"{RETRIEVER_AGENT_URL}/query", json=retriever_payload)
+    except Exception as e:
+        return {"error": str(e)}
+    return retriever_query_resp.json() if retriever_query_resp.status_code == 200 else {"error": retriever_query_resp.text}
+
+
+def build_llm_payload(user_text: str, ticker_intent_map, responses):
+    """Compact, token-budgeted context for the LLM, plus the context builder's token accounting."""
+    full_context, context_stats = build_context(responses, ticker_intent_map)
+    llm_payload = {
+        "user_query": user_text,
+        "retrieved_docs": [full_context],
+        "max_age_seconds": min((INTENT_MAX_AGE.get(intent, QUOTE_TTL) for intent in ticker_intent_map.values()), default=QUOTE_TTL)
+    }
+    return llm_payload, context_stats
+
+
+async def prepare_llm_request(client, user_text: str, timer: StageTimer):
+    """Parses the query, fetches agent data, indexes and retrieves it, and builds the LLM payload.
+
+    Also returns the context builder's token accounting for the response.
+    """
+    ticker_intent_map, responses = await parse_and_fetch(client, user_text, timer)
+
+    await index_documents(client, responses)
+    timer.end_stage("index_ms")
+
+    retriever_result = await retrieve(client, user_text, ticker_intent_map)
+    timer.end_stage("retrieve_ms")
+
+    llm_payload, context_stats = build_llm_payload(user_text, ticker_intent_map, responses)
+    return ticker_intent_map, responses, retriever_result, llm_payload, context_stats
+
+
+async def index_and_retrieve(client, user_text: str, ticker_intent_map, responses):
+    """Background half of the pipelined path; returns the retrieval result and its stage timings."""
+    start = time.perf_counter()
+    try:
+        await index_documents(client, responses)
+    except Exception as e:
+        print("Retriever add_documents failed:", e)
+    indexed = time.perf_counter()
+    telemetry.record_span("index", indexed - start)
+    retriever_result = await retrieve(client, user_text, ticker_intent_map)
+    done = time.perf_counter()
+    telemetry.record_span("retrieve", done - indexed)
+    return retriever_result, {
+        "index_ms": round((indexed - start) * 1000, 1),
+        "retrieve_ms": round((done - indexed) * 1000, 1)
+    }
+
+
+async def speak(client, text: str):
+    try:
+        response = await client.post(f"{TTS_AGENT_URL}/speak", json={"text": text})
+        return response.json() if response.status_code == 200 else {"error": response.text}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+class SentenceSpeaker:
+    """Hands each complete sentence of a streamed answer to the TTS agent without waiting for it.
+
+    Sentences are posted one after another so the TTS queue receives them in order.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.buffer = ""
+        self.sentences = 0
+        self.first_sentence_at = None
+        self.last_token_at = None
+        self._last = None
+
+    async def _speak_after(self, previous, text: str):
+        if previous is not None:
+            await asyncio.wait({previous})
+        await speak(self.client, text)
+
+    def _dispatch(self, text: str):
+        text = text.strip()
+        if not text:
+            return
+        if self.first_sentence_at is None:
+            self.first_sentence_at = time.perf_counter()
+        self.sentences += 1
+        self._last = run_in_background(self._speak_after(self._last, text))
+
+    def feed(self, token: str):
+        self.last_token_at = time.perf_counter()
+        self.buffer += token
+        parts = split_sentences(self.buffer)
+        for sentence in parts[:-1]:
+            self._dispatch(sentence)
+        self.buffer = parts[-1]
+
+    def close(self, fallback: str = NO_ANSWER):
+        self._dispatch(self.buffer)
+        self.buffer = ""
+        if not self.sentences:
+            self._dispatch(fallback)
+
+
+async def llm_tokens(client, llm_payload, result: dict):
+    """Yields tokens from the LLM agent's stream; the final answer or error is left in ``result``."""
+    try:
+        async with client.stream("POST", f"{LLM_AGENT_URL}/generate/stream", json=llm_payload, timeout=300.0) as llm_response:
+            if llm_response.status_code != 200:
+                result["error"] = (await llm_response.aread()).decode()
+                return
+            async for event in http_client.aiter_sse(llm_response):
+                if "token" in event:
+                    yield event["token"]
+                elif event.get("done"):
+                    result["response"] = event["response"]
+                elif "error" in event:
+                    result["error"] = event["error"]
+    except httpx.HTTPError as e:
+        result["error"] = str(e) or type(e).__name__
+
+
+def pipeline_savings(background_timings: dict, waited_ms: float, llm_end: float, speaker):
+    """Milliseconds each stage would have added to the response on the sequential path.
+
+    Indexing and retrieval are hidden except for the time spent waiting for them after
+    generation; the wait is attributed to retrieval first since it runs last. For TTS the
+    saving is how much earlier the first sentence reached the TTS agent than the last token
+    arrived, which is nothing when the answer came in one piece (e.g. from the LLM cache).
+    """
+    retrieve_wait = min(waited_ms, background_timings["retrieve_ms"])
+    saved = {
+        "index_ms": round(background_timings["index_ms"] - (waited_ms - retrieve_wait), 1),
+        "retrieve_ms": round(background_timings["retrieve_ms"] - retrieve_wait, 1),
+    }
+    if speaker is not None and speaker.first_sentence_at is not None:
+        generation_end = min(llm_end, speaker.last_token_at or llm_end)
+        saved["tts_first_sentence_ms"] = round(max(0.0, generation_end - speaker.first_sentence_at) * 1000, 1)
+    saved["total_ms"] = round(saved["index_ms"] + saved["retrieve_ms"] + saved.get("tts_first_sentence_ms", 0.0), 1)
+    return saved
+
+
+async def finish_pipeline(timer: StageTimer, background, llm_end: float, speaker):
+    """Waits for background indexing/retrieval and assembles timings with the latency saved per stage."""
+    retriever_result, background_timings = await background
+    timer.end_stage("retrieve_wait_ms")
+    timings = timer.finish()
+    timings.update(background_timings)
+    timings["latency_saved_ms"] = pipeline_savings(background_timings, timings["retrieve_wait_ms"], llm_end, speaker)
+    if speaker is not None:
+        timings["tts_sentences"] = speaker.sentences
+    return retriever_result, timings
+
+
+async def stop_background(background):
+    """Cancels background indexing/retrieval left running by an early exit and waits for it to end."""
+    if background is None:
+        return
+    background.cancel()
+    await asyncio.gather(background, return_exceptions=True)
+
+
+async def receive_transcription_pipelined(client, data: TranscriptionRequest, timer: StageTimer):
+    """Indexing and retrieval run in the background while the LLM generates; the answer is spoken
+    sentence by sentence as it streams in, and the response does not wait for any audio.
+    """
+    user_text = data.transcription
+    ticker_intent_map, responses = await parse_and_fetch(client, user_text, timer)
+    llm_payload, context_stats = build_llm_payload(user_text, ticker_intent_map, responses)
+    timer.end_stage("context_ms")
+
+    background = asyncio.create_task(index_and_retrieve(client, user_text, ticker_intent_map, responses))
+    speaker = SentenceSpeaker(client) if data.speak else None
+    llm_result = {}
+    try:
+        async for token in llm_tokens(client, llm_payload, llm_result):
+            if "llm_first_token_ms" not in timer.timings:
+                timer.mark("llm_first_token_ms")
+            if speaker is not None:
+                speaker.feed(token)
+        if speaker is not None:
+            speaker.close()
+        llm_end = time.perf_counter()
+        timer.end_stage("llm_ms")
+
+        retriever_result, timings = await finish_pipeline(timer, background, llm_end, speaker)
+    finally:
+        # no-op once finished; otherwise the task would outlive the request with its exception unretrieved
+        await stop_background(background)
+
+    return {
+        "user_query": user_text,
+        "ticker_intent_map": ticker_intent_map,
+        "agent_data": responses,
+        "retriever_result": retriever_result,
+        "llm_response": llm_result,
+        "context_stats": context_stats,
+        "timings": timings
+    }
+
+
+@app.post("/receive_transcription")
+async def receive_transcription(data: TranscriptionRequest):
+    timer = StageTimer()
+    user_text = data.transcription
+    print("Received transcription:", user_text)
+
+    client = http_client.get_async_client()
+    if PIPELINED_ORCHESTRATION if data.pipelined is None else data.pipelined:
+        return await receive_transcription_pipelined(client, data, timer)
+
+    ticker_intent_map, responses, retriever_result, llm_payload, context_stats = await prepare_llm_request(client, user_text, timer)
+
+    # Step 4: Call LLM agent
+    llm_response = await client.post(f"{LLM_AGENT_URL}/generate/", json=llm_payload, timeout=300.0)
+    llm_result = llm_response.json() if llm_response.status_code == 200 else {"error": llm_response.text}
+    timer.end_stage("llm_ms")
+    # Send the LLM response to TTS agent
+    if data.speak:
+        await speak(client, llm_result.get("response", NO_ANSWER))
+        timer.end_stage("tts_ms")
+
+    return {
+        "user_query": user_text,
+        "ticker_intent_map": ticker_intent_map,
+        "agent_data": responses,
+        "retriever_result": retriever_result,
+        "llm_response": llm_result,
+        "context_stats": context_stats,
+        "timings": timer.finish()
+    }
+
+
+@app.post("/receive_transcription/stream")
+async def receive_transcription_stream(data: TranscriptionRequest):
+    """Streaming variant of /receive_transcription as server-sent events.
+
+    Emits a ``context`` event once agent data is ready, one ``token`` event per LLM token,
+    then a ``done`` event with the full answer and timings. Each finished sentence is handed
+    to the TTS agent while the rest is still generating (unless ``speak`` is false). In
+    pipelined mode indexing and retrieval run alongside generation and the retrieval result
+    arrives in the ``done`` event instead of the ``context`` event.
+    """
+    timer = StageTimer()
+    user_text = data.transcription
+    print("Received transcription (stream):", user_text)
+
+    client = http_client.get_async_client()
+    pipelined = PIPELINED_ORCHESTRATION if data.pipelined is None else data.pipelined
+    if pipelined:
+        ticker_intent_map, responses = await parse_and_fetch(client, user_text, timer)
+        llm_payload, context_stats = build_llm_payload(user_text, ticker_intent_map, responses)
+        timer.end_stage("context_ms")
+        retriever_result = None
+    else:
+        ticker_intent_map, responses, retriever_result, llm_payload, context_stats = await prepare_llm_request(client, user_text, timer)
+
+    async def events():
+        background = None
+        if pipelined:
+            background = asyncio.create_task(index_and_retrieve(client, user_text, ticker_intent_map, responses))
+        try:
+            yield sse_event({
+                "event": "context",
+                "user_query": user_text,
+                "ticker_intent_map": ticker_intent_map,
+                "agent_data": responses,
+                "retriever_result": retriever_result,
+                "context_stats": context_stats
+            })
+            speaker = SentenceSpeaker(client) if data.speak else None
+            llm_result = {}
+            async for token in llm_tokens(client, llm_payload, llm_result):
+                if "llm_first_token_ms" not in timer.timings:
+                    timer.mark("llm_first_token_ms")
+                if speaker is not None:
+                    speaker.feed(token)
+                yield sse_event({"event": "token", "token": token})
+            if speaker is not None:
+                speaker.close()
+            llm_end = time.perf_counter()
+            timer.end_stage("llm_ms")
+            done = {"event": "done", "llm_response": llm_result}
+            if background is not None:
+                done["retriever_result"], done["timings"] = await finish_pipeline(timer, background, llm_end, speaker)
+            else:
+                done["timings"] = timer.finish()
+                if speaker is not None:
+                    done["timings"]["tts_sentences"] = speaker.sentences
+            yield sse_event(done)
+        finally:
+            # the client may disconnect mid-stream, closing this generator at a yield
+            await stop_background(background)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+# TTLs in seconds per endpoint; None means the value never changes (closed historical bars)
+QUOTE_TTL = float(os.getenv("QUOTE_TTL", "15"))
+EARNINGS_TTL = float(os.getenv("EARNINGS_TTL", str(6 * 3600)))
+OPEN_HISTORY_TTL = float(os.getenv("OPEN_HISTORY_TTL", "300"))
+EMPTY_TTL = float(os.getenv("EMPTY_RESULT_TTL", "30"))  # cap for empty results, which upstreams also return on errors
+CACHE_MAX_ENTRIES = int(os.getenv("MARKET_CACHE_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("MARKET_CACHE_REDIS_URL")  # optional store shared between workers
+REDIS_PREFIX = "market_cache:"
+
+
+class MarketCache:
+    """In-process TTL cache with single-flight loading and an optional shared Redis tier.
+
+    Concurrent misses for the same key share one upstream call. Loader errors are
+    propagated to every waiter and never cached; empty results are kept for at most EMPTY_TTL.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, redis_url: Optional[str] = REDIS_URL):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._redis = None
+        if redis_url:
+            if redis is None:
+                print("MARKET_CACHE_REDIS_URL is set but the redis package is not installed; using local cache only.")
+            else:
+                self._redis = redis.from_url(redis_url)
+
+    def _get_local(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    @staticmethod
+    def _ttl_for(value, ttl):
+        if callable(ttl):
+            ttl = ttl(value)
+        if not value and (ttl is None or ttl > EMPTY_TTL):
+            return EMPTY_TTL
+        return ttl
+
+    def _set_local(self, key, value, ttl):
+        self._entries[key] = (value, time.time() + ttl if ttl is not None else None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get_shared(self, key):
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(REDIS_PREFIX + key)
+            ttl = await self._redis.ttl(REDIS_PREFIX + key) if raw is not None else None
+        except Exception:
+            return None
+        if raw is None:
+            return None
+        return json.loads(raw), (ttl if ttl is not None and ttl > 0 else None)
+
+    async def _set_shared(self, key, value, ttl):
+        if self._redis is None:
+            return
+        try:
+            raw = json.dumps(value, default=str)
+            if ttl is not None:
+                await self._redis.set(REDIS_PREFIX + key, raw, ex=max(1, int(ttl)))
+            else:
+                await self._redis.set(REDIS_PREFIX + key, raw)
+        except Exception:
+            pass
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable], ttl):
+        """Cached value for ``key``, loading it on a miss; ``ttl`` is seconds, None, or a function of the loaded value."""
+        entry = self._get_local(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[0]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            shared = await self._get_shared(key)
+            if shared is not None:
+                self.hits += 1
+                value, remaining = shared
+                self._set_local(key, value, self._ttl_for(value, remaining if ttl is not None else None))
+            else:
+                self.misses += 1
+                value = await loader()
+                ttl = self._ttl_for(value, ttl)
+                self._set_local(key, value, ttl)
+                await self._set_shared(key, value, ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved so an unawaited failure is not logged
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def get_many_or_load(self, keys: list[str], loader: Callable[[list[str]], Awaitable[dict]], ttl: Optional[float]):
+        """Batch form of ``get_or_load``: all missing keys are fetched with a single ``loader(missing)`` call.
+
+        Keys already being loaded by another request are awaited rather than fetched again.
+        The loader returns a dict for the keys it could resolve; absent keys map to None.
+        """
+        results, waiting, missing = {}, {}, []
+        for key in dict.fromkeys(keys):
+            entry = self._get_local(key)
+            if entry is not None:
+                self.hits += 1
+                results[key] = entry[0]
+            elif key in self._inflight:
+                self.coalesced += 1
+                waiting[key] = self._inflight[key]
+            else:
+                missing.append(key)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in missing}
+            self._inflight.update(futures)
+            try:
+                self.misses += len(missing)
+                loaded = await loader(missing)
+                for key, future in futures.items():
+                    value = loaded.get(key)
+                    if value is not None:
+                        self._set_local(key, value, self._ttl_for(value, ttl))
+                        await self._set_shared(key, value, self._ttl_for(value, ttl))
+                    results[key] = value
+                    future.set_result(value)
+            except BaseException as e:
+                for future in futures.values():
+                    if not future.done():
+                        future.set_exception(e)
+                        future.exception()
+                raise
+            finally:
+                for key in missing:
+                    del self._inflight[key]
+
+        for key, future in waiting.items():
+            results[key] = await asyncio.shield(future)
+        return results
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "shared_store": self._redis is not None,
+        }
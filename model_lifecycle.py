@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+# Load models in the background as soon as the app starts; "0" defers loading to the first request
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+
+PROCESS_START = time.perf_counter()
+
+
+def _since_start():
+    return round(time.perf_counter() - PROCESS_START, 3)
+
+
+class LazyModel:
+    """A heavy model that is loaded on first use (or by a background warm-up), never at import.
+
+    ``get()`` blocks until the model is loaded and re-raises the load error if loading failed.
+    Attribute access is forwarded to the loaded model, so a ``LazyModel`` can be passed where
+    the model itself was expected. ``status()`` never triggers loading.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], object], warmup: Optional[Callable[[object], object]] = None):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.state = "not_loaded"
+        self.error = None
+        self.timings = {}
+        self._model = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def _load(self):
+        with self._lock:
+            if self.state in ("ready", "failed"):
+                return
+            self.state = "loading"
+            start = time.perf_counter()
+            try:
+                model = self.loader()
+                self.timings["load_seconds"] = round(time.perf_counter() - start, 3)
+                if self.warmup is not None:
+                    warm_start = time.perf_counter()
+                    self.warmup(model)
+                    self.timings["warmup_seconds"] = round(time.perf_counter() - warm_start, 3)
+            except Exception as e:
+                self.state = "failed"
+                self.error = f"{type(e).__name__}: {e}"
+                print(f"Loading {self.name} failed: {self.error}")
+                return
+            self._model = model
+            self.state = "ready"
+            self.timings["ready_after_start_seconds"] = _since_start()
+            print(f"{self.name} ready in {self.timings['load_seconds']}s")
+
+    def get(self):
+        if self.state != "ready":
+            first = "first_request_wait_seconds" not in self.timings
+            start = time.perf_counter()
+            self._load()
+            if first:
+                self.timings["first_request_wait_seconds"] = round(time.perf_counter() - start, 3)
+        if self.state == "failed":
+            raise RuntimeError(f"{self.name} is not available: {self.error}")
+        if "first_request_after_start_seconds" not in self.timings:
+            self.timings["first_request_after_start_seconds"] = _since_start()
+        return self._model
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
+
+    def start_background(self):
+        """Loads and warms the model on a daemon thread; requests arriving meanwhile wait on the same load."""
+        if self._thread is None and self.state == "not_loaded":
+            self._thread = threading.Thread(target=self._load, name=f"load-{self.name}", daemon=True)
+            self._thread.start()
+
+    def status(self):
+        status = {"state": self.state, **self.timings}
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+def add_lifecycle_routes(app: FastAPI, *models: LazyModel, warmup: bool = MODEL_WARMUP):
+    """Registers background warm-up on startup plus /health (liveness) and /ready (readiness).
+
+    Neither endpoint loads anything: /health answers as soon as the process serves HTTP,
+    /ready returns 503 until every model is loaded.
+    """
+    @app.on_event("startup")
+    async def start_model_warmup():
+        app.state.started_after_seconds = _since_start()
+        if warmup:
+            for model in models:
+                model.start_background()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/ready")
+    async def ready():
+        body = {
+            "ready": all(model.ready for model in models),
+            "uptime_seconds": _since_start(),
+            "started_after_seconds": getattr(app.state, "started_after_seconds", None),
+            "models": {model.name: model.status() for model in models},
+        }
+        return JSONResponse(body, status_code=200 if body["ready"] else 503)
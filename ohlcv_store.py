@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+OHLCV_DIR = os.getenv("OHLCV_DIR", "ohlcv")
+COLUMNS = ("date", "open", "high", "low", "close", "volume")
+MAX_CLOSED_DAYS = 4  # longest run of calendar days without a session (long weekend plus a holiday)
+DTYPES = {"date": "int64", "open": "float64", "high": "float64", "low": "float64", "close": "float64", "volume": "int64"}
+
+
+def to_day(d) -> int:
+    """Days since the Unix epoch for a date/datetime."""
+    return int(np.datetime64(d, "D").astype("int64"))
+
+
+def from_day(day: int) -> date:
+    return date(1970, 1, 1) + timedelta(days=int(day))
+
+
+def subtract_intervals(start: int, end: int, covered):
+    """Parts of [start, end) not covered by the sorted, disjoint ``covered`` intervals."""
+    gaps, cursor = [], start
+    for lo, hi in covered:
+        if hi <= cursor:
+            continue
+        if lo >= end:
+            break
+        if lo > cursor:
+            gaps.append((cursor, lo))
+        cursor = max(cursor, hi)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def merge_intervals(intervals):
+    merged = []
+    for lo, hi in sorted(intervals):
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def fetched_coverage(dates, gaps):
+    """Parts of ``gaps`` a download actually answered, given the bar dates it returned.
+
+    Each gap counts as covered up to its last returned bar, or to its end when the bars stop
+    no more than MAX_CLOSED_DAYS before it (weekends, holidays). A gap whose tail came back
+    empty (partial failure) keeps that tail open, so it is fetched again next time.
+    """
+    covered = []
+    for lo, hi in gaps:
+        inside = dates[(dates >= lo) & (dates < hi)]
+        last = int(inside[-1]) + 1 if len(inside) else lo
+        covered_hi = hi if hi - last <= MAX_CLOSED_DAYS else last
+        if covered_hi > lo:
+            covered.append([lo, covered_hi])
+    return covered
+
+
+def frame_to_columns(df) -> dict:
+    """Daily OHLCV DataFrame (yfinance layout) to column arrays keyed like COLUMNS."""
+    index = df.index.tz_localize(None) if getattr(df.index, "tz", None) is not None else df.index
+    return {
+        "date": index.values.astype("datetime64[D]").astype("int64"),
+        "open": df["Open"].to_numpy(dtype="float64"),
+        "high": df["High"].to_numpy(dtype="float64"),
+        "low": df["Low"].to_numpy(dtype="float64"),
+        "close": df["Close"].to_numpy(dtype="float64"),
+        "volume": df["Volume"].fillna(0).to_numpy(dtype="int64"),
+    }
+
+
+class OHLCVStore:
+    """Daily bars on disk as one .npy file per column per ticker, read back memory-mapped.
+
+    ``manifest.json`` names the current file generation and records which day ranges have
+    been fetched (market holidays have no rows, so coverage cannot be inferred from the
+    data). Each merge writes a new generation instead of overwriting files that readers may
+    still have mapped. Only closed days, before today, are ever persisted.
+    """
+
+    def __init__(self, root: str = OHLCV_DIR):
+        self.root = root
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._cache = {}
+
+    def _dir(self, ticker):
+        return os.path.join(self.root, ticker.upper())
+
+    def lock(self, ticker):
+        with self._locks_guard:
+            return self._locks.setdefault(ticker.upper(), threading.Lock())
+
+    def manifest(self, ticker):
+        path = os.path.join(self._dir(ticker), "manifest.json")
+        if not os.path.exists(path):
+            return {"generation": 0, "coverage": []}
+        with open(path) as f:
+            return json.load(f)
+
+    def coverage(self, ticker):
+        return self.manifest(ticker)["coverage"]
+
+    def columns(self, ticker) -> dict:
+        """Memory-mapped column arrays for a ticker (empty arrays if nothing is stored)."""
+        ticker = ticker.upper()
+        cached = self._cache.get(ticker)
+        if cached is not None:
+            return cached
+        directory = self._dir(ticker)
+        generation = self.manifest(ticker)["generation"]
+        if not generation:
+            return {name: np.empty(0, dtype=DTYPES[name]) for name in COLUMNS}
+        cols = {name: np.load(os.path.join(directory, f"{name}.{generation}.npy"), mmap_mode="r") for name in COLUMNS}
+        self._cache[ticker] = cols
+        return cols
+
+    def gaps(self, ticker, start_day: int, end_day: int):
+        """Closed-day ranges within [start_day, end_day) that still have to be fetched upstream."""
+        end_day = min(end_day, to_day(date.today()))
+        if end_day <= start_day:
+            return []
+        return subtract_intervals(start_day, end_day, self.coverage(ticker))
+
+    def merge(self, ticker, new_columns: dict, intervals):
+        """Adds fetched bars within the [start, end) ``intervals`` and marks them (up to yesterday) as covered."""
+        ticker = ticker.upper()
+        today = to_day(date.today())
+        intervals = [[lo, min(hi, today)] for lo, hi in intervals if min(hi, today) > lo]
+        if not intervals:
+            return
+        keep = np.zeros(len(new_columns["date"]), dtype=bool)
+        for lo, hi in intervals:
+            keep |= (new_columns["date"] >= lo) & (new_columns["date"] < hi)
+        old = self.columns(ticker)
+        dates = np.concatenate([np.asarray(old["date"]), new_columns["date"][keep]])
+        order = np.argsort(dates, kind="stable")
+        # later (fresher) rows win when a day appears twice
+        _, last = np.unique(dates[order][::-1], return_index=True)
+        picked = order[::-1][last]
+
+        directory = self._dir(ticker)
+        os.makedirs(directory, exist_ok=True)
+        manifest = self.manifest(ticker)
+        generation = manifest["generation"] + 1
+        for name in COLUMNS:
+            values = np.concatenate([np.asarray(old[name]), new_columns[name][keep].astype(DTYPES[name])])[picked]
+            np.save(os.path.join(directory, f"{name}.{generation}.npy"), values)
+        manifest = {"generation": generation, "coverage": merge_intervals(manifest["coverage"] + intervals)}
+        with open(os.path.join(directory, "manifest.json.tmp"), "w") as f:
+            json.dump(manifest, f)
+        os.replace(os.path.join(directory, "manifest.json.tmp"), os.path.join(directory, "manifest.json"))
+        self._cache.pop(ticker, None)
+        for name in os.listdir(directory):
+            parts = name.split(".")
+            if len(parts) == 3 and parts[2] == "npy" and parts[1].isdigit() and int(parts[1]) < generation:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass  # still mapped by a reader (Windows); removed on a later merge
+
+    def read(self, ticker, start_day: int, end_day: int) -> dict:
+        """Stored bars with start_day <= date < end_day, sliced from the memory-mapped columns."""
+        cols = self.columns(ticker)
+        lo, hi = np.searchsorted(cols["date"], [start_day, end_day])
+        return {name: np.asarray(cols[name][lo:hi]) for name in COLUMNS}
+
+
+def concat_columns(*parts) -> dict:
+    parts = [p for p in parts if p is not None and len(p["date"])]
+    if not parts:
+        return {name: np.empty(0, dtype=DTYPES[name]) for name in COLUMNS}
+    return {name: np.concatenate([p[name] for p in parts]) for name in COLUMNS}
+
+
+def columns_to_json(cols: dict) -> dict:
+    """Vectorised conversion of column arrays to the API's columnar JSON (prices rounded to cents)."""
+    return {
+        "date": np.datetime_as_string(cols["date"].astype("datetime64[D]")).tolist(),
+        "open": np.round(cols["open"], 2).tolist(),
+        "high": np.round(cols["high"], 2).tolist(),
+        "low": np.round(cols["low"], 2).tolist(),
+        "close": np.round(cols["close"], 2).tolist(),
+        "volume": cols["volume"].tolist(),
+    }
+
+
+def columns_to_rows(cols: dict) -> list[dict]:
+    """Row-per-day JSON as served by /historical/{ticker}, built from whole columns rather than iterrows."""
+    data = columns_to_json(cols)
+    return [dict(zip(COLUMNS, row)) for row in zip(*(data[name] for name in COLUMNS))]
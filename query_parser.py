@@ -0,0 +1,121 @@
+import os
+import re
+from typing import Optional
+
+# Known ticker symbols, one per line
+TICKERS_FILE = os.getenv("TICKERS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tickers.txt"))
+# Ask spaCy about capitalised words that are neither known tickers nor stopwords
+SPACY_FALLBACK = os.getenv("QUERY_PARSER_SPACY_FALLBACK", "1") == "1"
+
+# Intent keywords in priority order: a clause mentioning several intents takes the first
+INTENT_KEYWORDS = {
+    "earnings": ["earnings", "earnings report", "report"],
+    "historical": ["history", "historical", "past", "previous"],
+    "price": ["price", "stock", "quote", "current price"]
+}
+DEFAULT_INTENT = "price"
+
+# Capitalised words that are never tickers unless written as a cashtag ($ALL, $NOW, ...)
+STOPWORDS = frozenset("""
+    A AM AN AND ANY ARE AS AT BE BIG BUT BY CAN DO FOR GO HAS HE HOW I IF IN IS IT ITS ME MY NEW NO NOT NOW
+    OF OK ON ONE OR OUR OUT SO THE TO TWO UP US WE WHAT WHEN WHO WHY YOU ALL GIVE PLEASE SHOW TELL
+    PRICE STOCK QUOTE REPORT HISTORY EARNINGS
+    AI API CEO CFO COO CTO EPS ETF EU EUR FED FY GDP IPO NYSE PE PM SEC TV UK USA USD YOY YTD QOQ EOD
+    Q1 Q2 Q3 Q4
+""".split())
+
+
+def load_tickers(path: str = TICKERS_FILE) -> frozenset:
+    if not os.path.isfile(path):
+        print(f"Ticker list not found at {path}; only cashtags and spaCy-confirmed symbols will be recognised.")
+        return frozenset()
+    with open(path) as f:
+        return frozenset(line.strip().upper() for line in f if line.strip() and not line.startswith("#"))
+
+
+class QueryParser:
+    """Splits a transcription into "and" clauses and maps each ticker in a clause to the clause's intent.
+
+    Everything is precompiled: one regex for clause boundaries, one alternation for all intent
+    keywords and one for candidate symbols, checked against a hash set of known tickers.
+    spaCy is only consulted (and only loaded) when a capitalised word is neither a known
+    ticker nor a stopword.
+    """
+
+    def __init__(self, tickers: frozenset, intent_keywords: dict = INTENT_KEYWORDS, nlp=None, spacy_fallback: bool = SPACY_FALLBACK):
+        self.tickers = tickers
+        self.nlp = nlp
+        self.spacy_fallback = spacy_fallback and nlp is not None
+        self.priority = {intent: i for i, intent in enumerate(intent_keywords)}
+        self.counters = {"parsed": 0, "spacy_fallbacks": 0, "rejected_symbols": 0}
+        self._clause_split = re.compile(r"\band\b", re.IGNORECASE)
+        # keywords match whole words only (plural allowed): "past" must not match "pasta"
+        self._intents = re.compile(
+            "|".join(
+                f"(?P<{intent}>\\b(?:{'|'.join(re.escape(kw) for kw in sorted(keywords, key=len, reverse=True))})s?\\b)"
+                for intent, keywords in intent_keywords.items()
+            ),
+            re.IGNORECASE,
+        )
+        self._symbols = re.compile(r"(\$)?\b([A-Z]{1,5}(?:\.[A-Z])?)\b")
+
+    def intent_for(self, clause: str) -> str:
+        best = None
+        for match in self._intents.finditer(clause):
+            if best is None or self.priority[match.lastgroup] < self.priority[best]:
+                best = match.lastgroup
+        return best or DEFAULT_INTENT
+
+    def _classify(self, symbol: str, cashtag: bool) -> str:
+        if cashtag:
+            return "ticker"
+        if symbol in STOPWORDS:
+            return "reject"
+        if symbol in self.tickers:
+            return "ticker"
+        return "ambiguous"
+
+    def _confirm_with_spacy(self, text: str, symbols: set) -> set:
+        """Symbols spaCy tags as an organisation/product entity or a proper noun."""
+        self.counters["spacy_fallbacks"] += 1
+        try:
+            doc = self.nlp.get()(text)
+        except Exception as e:
+            print(f"spaCy fallback unavailable, dropping {sorted(symbols)}: {str(e)}")
+            return set()
+        return {
+            token.text for token in doc
+            if token.text in symbols and (token.ent_type_ in ("ORG", "PRODUCT") or token.pos_ == "PROPN")
+        }
+
+    def parse(self, text: str) -> dict:
+        self.counters["parsed"] += 1
+        found, ambiguous = [], set()
+        for clause in self._clause_split.split(text):
+            symbols = []
+            for match in self._symbols.finditer(clause):
+                symbol = match.group(2)
+                kind = self._classify(symbol, match.group(1) is not None)
+                if kind == "reject":
+                    self.counters["rejected_symbols"] += 1
+                    continue
+                if kind == "ambiguous":
+                    ambiguous.add(symbol)
+                symbols.append(symbol)
+            if symbols:
+                found.append((symbols, self.intent_for(clause)))
+
+        confirmed = set()
+        if ambiguous and self.spacy_fallback:
+            confirmed = self._confirm_with_spacy(text, ambiguous)
+        self.counters["rejected_symbols"] += len(ambiguous - confirmed)
+
+        ticker_intent_map = {}
+        for symbols, intent in found:
+            for symbol in symbols:
+                if symbol not in ambiguous or symbol in confirmed:
+                    ticker_intent_map[symbol] = intent
+        return ticker_intent_map
+
+    def stats(self, spacy_state: Optional[str] = None):
+        return dict(self.counters, known_tickers=len(self.tickers), spacy_fallback=self.spacy_fallback, spacy=spacy_state)
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+# Generated-answer cache settings
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "0") == "1"
+SEMANTIC_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", "0.95"))
+
+
+def normalize_query(text: str) -> str:
+    """Case, whitespace and trailing punctuation do not change the answer."""
+    return re.sub(r"\s+", " ", text).strip().rstrip("?.!").strip().lower()
+
+
+def normalize_doc(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def docs_key(docs: list[str]) -> str:
+    digest = hashlib.sha256()
+    for doc in docs:
+        normalized = normalize_doc(doc)
+        if normalized:
+            digest.update(normalized.encode("utf-8"))
+            digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def response_key(template: str, docs: list[str], query: str) -> str:
+    """Hash of the prompt template, normalized documents and normalized query."""
+    digest = hashlib.sha256()
+    for part in (template, docs_key(docs), normalize_query(query)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """LRU cache of generated answers with per-entry TTLs.
+
+    The optional semantic layer only matches entries built from the same documents, so a
+    reworded question is answered from cache but a changed quote never is.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, threshold: float = SEMANTIC_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (response, expires_at, docs_key)
+        self._vectors = {}  # docs_key -> {key: unit query vector}
+
+    def _drop(self, key):
+        _, _, dkey = self._entries.pop(key)
+        group = self._vectors.get(dkey)
+        if group is not None:
+            group.pop(key, None)
+            if not group:
+                del self._vectors[dkey]
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, key: str) -> Optional[str]:
+        response = self._live(key)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def get_similar(self, dkey: str, vector: np.ndarray) -> Optional[str]:
+        """Best cached answer over the same documents whose query is within the similarity threshold."""
+        group = self._vectors.get(dkey)
+        if not group:
+            return None
+        keys = list(group)
+        scores = np.stack([group[k] for k in keys]) @ _unit(vector)
+        for i in np.argsort(-scores):
+            if scores[i] < self.threshold:
+                break
+            response = self._live(keys[i])
+            if response is not None:
+                self.semantic_hits += 1
+                self.misses -= 1  # counted by the exact lookup that preceded this one
+                return response
+        return None
+
+    def put(self, key: str, response: str, ttl: float, dkey: str, vector: Optional[np.ndarray] = None):
+        if ttl <= 0:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (response, time.time() + ttl, dkey)
+        if vector is not None:
+            self._vectors.setdefault(dkey, {})[key] = _unit(vector)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "semantic": RESPONSE_CACHE_SEMANTIC,
+            "threshold": self.threshold,
+        }
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype="float32").ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
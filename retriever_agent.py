@@ -1,66 +1,117 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
-import faiss
-import numpy as np
-import pickle
-
-app = FastAPI()
-
-index = None
-documents = []
-
-model = SentenceTransformer('all-MiniLM-L6-v2')
-
-class DocsRequest(BaseModel):
-    docs: list[str]
-    
-class QueryRequest(BaseModel):
-    query: str
-    top_k: int = 3  # default number of results
-
-
-@app.on_event("startup")
-def startup_event():
-    global index, documents
-    try:
-        with open("documents.pkl", "rb") as f:
-            documents = pickle.load(f)
-        index = faiss.read_index("faiss.index")
-        print("Loaded existing FAISS index and documents.")
-    except Exception:
-        dim = 384
-        index = faiss.IndexFlatL2(dim)
-        documents = []
-        print("Initialized empty FAISS index.")
-
-@app.post("/add_documents")
-def add_documents(req: DocsRequest):
-    docs = req.docs
-    global index, documents
-    embeddings = model.encode(docs, convert_to_numpy=True)
-    if index.ntotal == 0:
-        index = faiss.IndexFlatL2(embeddings.shape[1])
-    if isinstance(embeddings, list):
-        embeddings = np.array(embeddings)
-        if embeddings.ndim == 1:
-            embeddings = embeddings.reshape(1, -1)  # make it (1, d) if only one doc
-
-    index.add(embeddings)
-    documents.extend(docs)
-    faiss.write_index(index, "faiss.index")
-    with open("documents.pkl", "wb") as f:
-        pickle.dump(documents, f)
-    return {"message": f"Added {len(docs)} documents."}
-
-
-@app.post("/query")
-def query(req: QueryRequest):
-    if index.ntotal == 0:
-        raise HTTPException(status_code=400, detail="No documents in index.")
-    query_embedding = model.encode([req.query], convert_to_numpy=True)
-    distances, indices = index.search(query_embedding, req.top_k)
-    results = [documents[idx] for idx in indices[0] if idx < len(documents)]
-    return {"results": results}
-
-
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+import telemetry
+from embedder import EMBEDDING_BACKEND, EMBEDDING_MODEL, Embedder, load_embedding_model
+from model_lifecycle import LazyModel, add_lifecycle_routes
+from vector_store import VectorStore
+
+app = FastAPI()
+telemetry.instrument(app, "retriever")
+
+store = VectorStore()
+telemetry.gauge("index_vectors", "Vectors in the FAISS index.", lambda: store.ntotal)
+telemetry.gauge("index_live_documents", "Documents that are not expired or replaced.", lambda: store.live_count)
+
+model = LazyModel(f"{EMBEDDING_MODEL} ({EMBEDDING_BACKEND})", load_embedding_model, warmup=lambda m: m.encode(["warm-up"]))
+embedder = Embedder(model)  # the batcher's first encode loads the model if warm-up has not
+add_lifecycle_routes(app, model)
+telemetry.gauge("embedding_cache_hits", "Embedding cache hits.", lambda: embedder.cache.hits)
+telemetry.gauge("embedding_cache_misses", "Embedding cache misses.", lambda: embedder.cache.misses)
+
+class DocMetadata(BaseModel):
+    ticker: Optional[str] = None
+    source: Optional[str] = None  # agent that produced the document; selects the default TTL
+    timestamp: Optional[float] = None  # unix seconds, defaults to ingest time
+    ttl_seconds: Optional[float] = None  # overrides the per-source TTL; 0 never expires
+
+class DocsRequest(BaseModel):
+    docs: list[str]
+    metadata: Optional[list[DocMetadata]] = None  # one entry per doc
+    
+class QueryRequest(BaseModel):
+    query: str
+    top_k: int = 3  # default number of results
+    nprobe: Optional[int] = None  # IVF indexes: clusters to scan
+    ef_search: Optional[int] = None  # HNSW index: candidate list size
+    tickers: Optional[list[str]] = None  # only documents about these tickers
+    sources: Optional[list[str]] = None  # only documents pushed by these agents
+    start_date: Optional[str] = None  # YYYY-MM-DD, inclusive
+    end_date: Optional[str] = None  # YYYY-MM-DD, exclusive
+    with_metadata: bool = False
+
+class EmbedRequest(BaseModel):
+    texts: list[str]
+
+
+@app.on_event("startup")
+def startup_event():
+    embedder.start()
+    store.open()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    embedder.stop()
+    store.close()
+
+@app.post("/add_documents")
+def add_documents(req: DocsRequest):
+    docs = req.docs
+    if req.metadata is not None and len(req.metadata) != len(docs):
+        raise HTTPException(status_code=400, detail="metadata must have one entry per document.")
+    metadatas = [m.dict() for m in req.metadata] if req.metadata else None
+    with telemetry.span("index_add", docs=len(docs)):
+        added = store.add(docs, embedder.encode, metadatas)
+    return {"message": f"Added {added} documents.", "duplicates": len(docs) - added}
+
+
+@app.post("/query")
+def query(req: QueryRequest):
+    if store.ntotal == 0:
+        raise HTTPException(status_code=400, detail="No documents in index.")
+    try:
+        start = datetime.strptime(req.start_date, "%Y-%m-%d").timestamp() if req.start_date else None
+        end = datetime.strptime(req.end_date, "%Y-%m-%d").timestamp() if req.end_date else None
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(ve)}")
+    with telemetry.span("embed_query"):
+        query_embedding = embedder.encode([req.query])
+    with telemetry.span("search", top_k=req.top_k):
+        matches = store.search(
+            query_embedding, req.top_k, nprobe=req.nprobe, ef_search=req.ef_search,
+            tickers=req.tickers, sources=req.sources, start=start, end=end
+        )
+    response = {"results": [match["text"] for match in matches]}
+    if req.with_metadata:
+        response["matches"] = [
+            {key: match[key] for key in ("text", "ticker", "source", "timestamp", "distance")} for match in matches
+        ]
+    return response
+
+
+@app.post("/embed")
+def embed(req: EmbedRequest):
+    """MiniLM embeddings through the shared cache and batcher, for other agents' similarity checks."""
+    if not req.texts:
+        raise HTTPException(status_code=400, detail="No texts provided.")
+    return {"embeddings": embedder.encode(req.texts).tolist()}
+
+
+@app.get("/embedding_stats")
+def embedding_stats():
+    return embedder.stats()
+
+
+@app.get("/index_stats")
+def index_stats():
+    return store.stats()
+
+
+@app.get("/index_report")
+def index_report(sample_queries: int = 200, top_k: int = 10, max_vectors: int = 200000):
+    """Recall-vs-latency of each ANN index type against exact search over the stored vectors."""
+    return store.recall_report(sample_queries=sample_queries, top_k=top_k, max_vectors=max_vectors)
+
+
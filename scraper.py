@@ -1,62 +1,258 @@
-import pandas as pd
-import yfinance as yf
-import math
-import requests
-from fastapi import FastAPI
-
-app = FastAPI()
-
-RETRIEVER_URL = "http://localhost:8004/add_documents"
-
-def push_to_retriever(docs: list[str]):
-    try:
-        response = requests.post(RETRIEVER_URL, json={"docs": docs})
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
-
-def fetch_earnings_data(tickers):
-    results = []
-    for ticker in tickers:
-        company_data = {"ticker": ticker}
-        try:
-            stock = yf.Ticker(ticker)
-            income_stmt = stock.quarterly_income_stmt
-            if income_stmt is None or income_stmt.empty:
-                company_data['quarterly_net_income'] = None
-            else:
-                net_income_series = income_stmt.loc['Net Income'] if 'Net Income' in income_stmt.index else None
-                company_data['quarterly_net_income'] = net_income_series.to_dict() if net_income_series is not None else None
-            company_data['earnings_dates'] = []
-        except Exception as e:
-            company_data['error'] = str(e)
-        results.append(company_data)
-    return results
-
-def clean_data(results):
-    for entry in results:
-        net_income = entry.get('quarterly_net_income')
-        if isinstance(net_income, dict):
-            cleaned_net_income = {}
-            for k, v in net_income.items():
-                key_str = k.strftime('%Y-%m-%d') if hasattr(k, 'strftime') else str(k)
-                value = None if (isinstance(v, float) and math.isnan(v)) else v
-                cleaned_net_income[key_str] = value
-            entry['quarterly_net_income'] = cleaned_net_income
-    return results
-
-def generate_summary(entry):
-    ticker = entry.get("ticker")
-    ni = entry.get("quarterly_net_income")
-    if not ni:
-        return f"{ticker} has no recent net income data."
-    return f"{ticker} net income: " + ", ".join([f"{d}: {v}" for d, v in ni.items()])
-
-@app.post("/push_scraped_data/{ticker}")
-def push_scraped_data(ticker: str):
-    raw = fetch_earnings_data([ticker])
-    cleaned = clean_data(raw)
-    summaries = [generate_summary(entry) for entry in cleaned]
-    result = push_to_retriever(summaries)
-    return {"summaries": summaries, "retriever_response": result}
+import pandas as pd
+import yfinance as yf
+import math
+import os
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+import http_client
+import telemetry
+
+app = FastAPI()
+telemetry.instrument(app, "scraper")
+
+RETRIEVER_URL = "http://localhost:8004/add_documents"
+
+# Bulk scrape job settings
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "8"))
+SCRAPE_PUSH_BATCH = int(os.getenv("SCRAPE_PUSH_BATCH", "50"))  # summaries per add_documents call
+SCRAPE_MAX_TICKERS = int(os.getenv("SCRAPE_MAX_TICKERS", "2000"))
+SCRAPE_JOB_HISTORY = int(os.getenv("SCRAPE_JOB_HISTORY", "50"))
+# Requests per second allowed against each upstream host
+HOST_RATE_LIMITS = {
+    "finance.yahoo.com": float(os.getenv("YAHOO_REQUESTS_PER_SECOND", "5")),
+}
+
+
+class RateLimiter:
+    """Thread-safe token bucket; ``acquire`` blocks until a request may be sent."""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+rate_limiters = {host: RateLimiter(rate) for host, rate in HOST_RATE_LIMITS.items()}
+executor = ThreadPoolExecutor(max_workers=SCRAPE_WORKERS, thread_name_prefix="scrape")
+jobs = OrderedDict()
+jobs_lock = threading.Lock()
+
+
+class ScrapeJobRequest(BaseModel):
+    tickers: list[str]
+
+
+class ScrapeJob:
+    """Progress of one bulk scrape; updated by its runner thread, read by the status endpoints under ``lock``."""
+
+    def __init__(self, tickers: list[str]):
+        self.id = uuid.uuid4().hex[:12]
+        self.tickers = tickers
+        self.status = "queued"
+        self.fetched = 0
+        self.failed = 0
+        self.pushed = 0
+        self.push_errors = []
+        self.errors = {}
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+
+    def progress(self):
+        with self.lock:
+            return self._progress()
+
+    def _progress(self):
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0
+        done = self.fetched + self.failed
+        throughput = done / elapsed if elapsed else 0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": len(self.tickers),
+            "fetched": self.fetched,
+            "failed": self.failed,
+            "pushed": self.pushed,
+            "percent": round(100 * done / len(self.tickers), 1) if self.tickers else 100.0,
+            "elapsed_seconds": round(elapsed, 2),
+            "tickers_per_second": round(throughput, 2),
+            "eta_seconds": round((len(self.tickers) - done) / throughput, 1) if throughput and self.status == "running" else None,
+            "errors": dict(list(self.errors.items())[:20]),
+            "push_errors": self.push_errors[-5:],
+        }
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    with jobs_lock:
+        for job in jobs.values():
+            job.cancelled.set()
+    executor.shutdown(wait=False, cancel_futures=True)
+    http_client.close_session()
+
+def push_to_retriever(docs: list[str], tickers: list[str] = None):
+    try:
+        metadata = [{"ticker": ticker, "source": "scraper"} for ticker in (tickers or [None] * len(docs))]
+        response = http_client.get_session().post(RETRIEVER_URL, json={"docs": docs, "metadata": metadata})
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        return {"error": str(e)}
+
+def fetch_company_data(ticker):
+    company_data = {"ticker": ticker}
+    try:
+        with telemetry.span("rate_limit_wait"):
+            rate_limiters["finance.yahoo.com"].acquire()
+        with telemetry.span("fetch_company_data", ticker=ticker):
+            stock = yf.Ticker(ticker)
+            income_stmt = stock.quarterly_income_stmt
+        if income_stmt is None or income_stmt.empty:
+            company_data['quarterly_net_income'] = None
+        else:
+            net_income_series = income_stmt.loc['Net Income'] if 'Net Income' in income_stmt.index else None
+            company_data['quarterly_net_income'] = net_income_series.to_dict() if net_income_series is not None else None
+        company_data['earnings_dates'] = []
+    except Exception as e:
+        company_data['error'] = str(e)
+    return company_data
+
+def fetch_earnings_data(tickers):
+    return [fetch_company_data(ticker) for ticker in tickers]
+
+def clean_data(results):
+    for entry in results:
+        net_income = entry.get('quarterly_net_income')
+        if isinstance(net_income, dict):
+            cleaned_net_income = {}
+            for k, v in net_income.items():
+                key_str = k.strftime('%Y-%m-%d') if hasattr(k, 'strftime') else str(k)
+                value = None if (isinstance(v, float) and math.isnan(v)) else v
+                cleaned_net_income[key_str] = value
+            entry['quarterly_net_income'] = cleaned_net_income
+    return results
+
+def generate_summary(entry):
+    ticker = entry.get("ticker")
+    ni = entry.get("quarterly_net_income")
+    if not ni:
+        return f"{ticker} has no recent net income data."
+    return f"{ticker} net income: " + ", ".join([f"{d}: {v}" for d, v in ni.items()])
+
+@app.post("/push_scraped_data/{ticker}")
+def push_scraped_data(ticker: str):
+    raw = fetch_earnings_data([ticker])
+    cleaned = clean_data(raw)
+    summaries = [generate_summary(entry) for entry in cleaned]
+    result = push_to_retriever(summaries, [entry["ticker"] for entry in cleaned])
+    return {"summaries": summaries, "retriever_response": result}
+
+def run_scrape_job(job: ScrapeJob):
+    """Fetches on the shared pool and cleans, summarizes and pushes results in batches as they complete."""
+    with job.lock:
+        job.status = "running"
+        job.started = time.time()
+    batch_docs, batch_tickers = [], []
+
+    def flush():
+        if not batch_docs:
+            return
+        result = push_to_retriever(batch_docs, batch_tickers)
+        with job.lock:
+            if "error" in result:
+                job.push_errors.append(result["error"])
+            else:
+                job.pushed += len(batch_docs)
+        batch_docs.clear()
+        batch_tickers.clear()
+
+    futures = [executor.submit(contextvars.copy_context().run, fetch_company_data, ticker) for ticker in job.tickers]
+    try:
+        for future in as_completed(futures):
+            if job.cancelled.is_set():
+                break
+            entry = clean_data([future.result()])[0]
+            with job.lock:
+                if "error" in entry:
+                    job.failed += 1
+                    job.errors[entry["ticker"]] = entry["error"]
+                    continue
+                job.fetched += 1
+            batch_docs.append(generate_summary(entry))
+            batch_tickers.append(entry["ticker"])
+            if len(batch_docs) >= SCRAPE_PUSH_BATCH:
+                flush()
+        flush()
+        with job.lock:
+            job.status = "cancelled" if job.cancelled.is_set() else "completed"
+    except Exception as e:
+        with job.lock:
+            job.status = "failed"
+            job.errors["_job"] = str(e)
+    finally:
+        for future in futures:
+            future.cancel()
+        with job.lock:
+            job.finished = time.time()
+
+@app.post("/scrape_jobs")
+def create_scrape_job(req: ScrapeJobRequest):
+    tickers = list(dict.fromkeys(t.strip().upper() for t in req.tickers if t.strip()))
+    if not tickers:
+        raise HTTPException(status_code=400, detail="No tickers given.")
+    if len(tickers) > SCRAPE_MAX_TICKERS:
+        raise HTTPException(status_code=400, detail=f"At most {SCRAPE_MAX_TICKERS} tickers per job.")
+    job = ScrapeJob(tickers)
+    with jobs_lock:
+        jobs[job.id] = job
+        # drop the oldest finished jobs; running ones are kept however old they are
+        excess = len(jobs) - SCRAPE_JOB_HISTORY
+        for old_id in [job_id for job_id, old in jobs.items() if old.finished is not None][:max(excess, 0)]:
+            del jobs[old_id]
+    context = contextvars.copy_context()  # the job's spans carry the creating request's trace ID
+    threading.Thread(target=context.run, args=(run_scrape_job, job), name=f"scrape-job-{job.id}", daemon=True).start()
+    return job.progress()
+
+@app.get("/scrape_jobs")
+def list_scrape_jobs():
+    with jobs_lock:
+        listed = list(jobs.values())
+    return {"jobs": [job.progress() for job in listed]}
+
+@app.get("/scrape_jobs/{job_id}")
+def get_scrape_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No scrape job '{job_id}'.")
+    return job.progress()
+
+@app.delete("/scrape_jobs/{job_id}")
+def cancel_scrape_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No scrape job '{job_id}'.")
+    job.cancelled.set()
+    return job.progress()
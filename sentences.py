@@ -0,0 +1,28 @@
+import re
+
+# a sentence ends at . ! or ? followed by whitespace and a capital, unless the word is an abbreviation or initials
+SENTENCE_BOUNDARY = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"')\]]))\s+(?=[\"'(\[]?[A-Z])")
+INITIALS = re.compile(r"^(?:[A-Za-z]\.)+$")  # U.S., e.g., J.
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "jr", "sr", "st", "inc", "corp", "co", "ltd", "llc", "plc", "vs", "etc",
+    "approx", "est", "no", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+LINE_BREAKS = re.compile(r"\n+")
+
+
+def split_sentences(text: str) -> list[str]:
+    """Complete sentences in ``text`` followed by the unfinished remainder (possibly empty)."""
+    parts, start = [], 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        word = text[start:match.start()].split()[-1].strip("\"'()[]")
+        if INITIALS.match(word) or word[:-1].lower() in ABBREVIATIONS:
+            continue
+        parts.append(text[start:match.start()])
+        start = match.end()
+    parts.append(text[start:])
+    return parts
+
+
+def sentences(text: str) -> list[str]:
+    """Every sentence of a finished text, stripped; a line break also ends a sentence."""
+    return [part.strip() for line in LINE_BREAKS.split(text) for part in split_sentences(line) if part.strip()]
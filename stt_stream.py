@@ -0,0 +1,189 @@
+import os
+import queue
+import time
+from typing import Iterator, Optional
+
+import numpy as np
+from scipy.io import wavfile
+
+import telemetry
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+# Streaming speech-to-text settings
+SAMPLE_RATE = 16000
+FRAME_MS = 30  # VAD frame length (webrtcvad accepts 10, 20 or 30 ms)
+END_SILENCE_MS = int(os.getenv("STT_END_SILENCE_MS", "700"))  # trailing silence that ends an utterance
+PARTIAL_INTERVAL_MS = int(os.getenv("STT_PARTIAL_INTERVAL_MS", "1000"))  # new speech between partial hypotheses
+MAX_UTTERANCE_SECONDS = float(os.getenv("STT_MAX_UTTERANCE_SECONDS", "30"))
+PARTIAL_WINDOW_SECONDS = float(os.getenv("STT_PARTIAL_WINDOW_SECONDS", "8"))  # trailing audio decoded for a partial
+VAD_AGGRESSIVENESS = int(os.getenv("STT_VAD_AGGRESSIVENESS", "2"))  # webrtcvad 0-3
+ENERGY_THRESHOLD = float(os.getenv("STT_ENERGY_THRESHOLD", "0.01"))  # RMS fallback when webrtcvad is not installed
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "en")
+
+
+def to_float32(pcm) -> np.ndarray:
+    """PCM (bytes of int16, or an int16/int32/uint8 array) or float audio to mono float32 in [-1, 1]."""
+    if isinstance(pcm, (bytes, bytearray, memoryview)):
+        pcm = np.frombuffer(pcm, dtype=np.int16)
+    pcm = np.asarray(pcm)
+    if pcm.dtype.kind in "iu":
+        full_scale = float(2 ** (8 * pcm.itemsize - 1))
+        offset = full_scale if pcm.dtype.kind == "u" else 0.0  # 8-bit WAV is unsigned, centred on 128
+        pcm = (pcm.astype(np.float32) - offset) / full_scale
+    else:
+        pcm = pcm.astype(np.float32)
+    if pcm.ndim > 1:
+        pcm = pcm.mean(axis=1)
+    return pcm
+
+
+class VoiceActivityDetector:
+    """Per-frame speech/non-speech decisions, using webrtcvad when available and RMS energy otherwise."""
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, aggressiveness: int = VAD_AGGRESSIVENESS,
+                 energy_threshold: float = ENERGY_THRESHOLD):
+        self.sample_rate = sample_rate
+        self.energy_threshold = energy_threshold
+        self._vad = webrtcvad.Vad(aggressiveness) if webrtcvad is not None else None
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        if self._vad is not None:
+            pcm = (np.clip(frame, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+            return self._vad.is_speech(pcm, self.sample_rate)
+        return float(np.sqrt(np.mean(frame * frame))) >= self.energy_threshold
+
+
+class StreamingTranscriber:
+    """Buffers incoming audio in memory and turns it into partial and final transcripts.
+
+    ``feed`` returns a list of ``{"type": "partial" | "final", "text": ...}`` events. Partials
+    are produced every PARTIAL_INTERVAL_MS of new speech and cover only the trailing
+    PARTIAL_WINDOW_SECONDS, so each costs the same however long the utterance runs; a final
+    transcript decodes the whole utterance once END_SILENCE_MS of silence follows speech, after
+    which the buffer is reset for the next utterance. Leading silence is never buffered.
+    """
+
+    def __init__(self, model, sample_rate: int = SAMPLE_RATE, vad: Optional[VoiceActivityDetector] = None):
+        self.model = model
+        self.sample_rate = sample_rate
+        self.vad = vad or VoiceActivityDetector(sample_rate)
+        self.frame = sample_rate * FRAME_MS // 1000
+        self.partial_frames = max(1, int(PARTIAL_WINDOW_SECONDS * 1000 // FRAME_MS))
+        self._pending = np.empty(0, dtype=np.float32)
+        self._reset()
+
+    def _reset(self):
+        self._chunks = []
+        self._samples = 0
+        self._speech_samples = 0
+        self._speech_end = 0
+        self._silence_ms = 0
+        self._since_partial = 0
+        self._speech_started_at = None
+
+    def _transcribe(self, final: bool) -> str:
+        # a partial decodes only the trailing window: re-decoding the whole buffer every time is quadratic
+        chunks = self._chunks if final else self._chunks[-self.partial_frames:]
+        audio = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float32)
+        # the trailing silence that ended the utterance carries no words; keep a short tail only
+        audio = audio[:self._speech_end - (self._samples - len(audio)) + self.sample_rate // 5]
+        if not len(audio):
+            return ""
+        # partials favour speed; the final pass uses the model's default beam search
+        options = {} if final else {"beam_size": 1, "without_timestamps": True}
+        with telemetry.span("stt_final" if final else "stt_partial", audio_seconds=round(len(audio) / self.sample_rate, 2)):
+            segments, _ = self.model.transcribe(audio, language=STT_LANGUAGE or None, **options)
+            return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def _final_event(self):
+        start = time.perf_counter()
+        text = self._transcribe(final=True)
+        event = {"type": "final", "text": text,
+                 "speech_seconds": round(self._speech_samples / self.sample_rate, 2),
+                 "transcribe_ms": round((time.perf_counter() - start) * 1000, 1)}
+        if self._speech_started_at is not None:
+            event["utterance_ms"] = round((time.perf_counter() - self._speech_started_at) * 1000, 1)
+        self._reset()
+        return event
+
+    def feed(self, pcm) -> list[dict]:
+        events = []
+        audio = np.concatenate([self._pending, to_float32(pcm)])
+        usable = len(audio) - len(audio) % self.frame
+        self._pending = audio[usable:]
+        for start in range(0, usable, self.frame):
+            frame = audio[start:start + self.frame]
+            speech = self.vad.is_speech(frame)
+            if not self._speech_samples and not speech:
+                continue
+            if self._speech_started_at is None:
+                self._speech_started_at = time.perf_counter()
+            self._chunks.append(frame)
+            self._samples += len(frame)
+            if speech:
+                self._speech_samples += len(frame)
+                self._speech_end = self._samples
+                self._silence_ms = 0
+                self._since_partial += FRAME_MS
+            else:
+                self._silence_ms += FRAME_MS
+            if self._silence_ms >= END_SILENCE_MS or self._samples >= MAX_UTTERANCE_SECONDS * self.sample_rate:
+                events.append(self._final_event())
+            elif self._since_partial >= PARTIAL_INTERVAL_MS:
+                self._since_partial = 0
+                events.append({"type": "partial", "text": self._transcribe(final=False)})
+        return events
+
+    def flush(self) -> list[dict]:
+        """Finalises whatever speech is buffered (end of stream or end of file)."""
+        if not self._speech_samples:
+            self._reset()
+            return []
+        return [self._final_event()]
+
+
+def file_chunks(path: str, chunk_ms: int = 100, sample_rate: int = SAMPLE_RATE) -> Iterator[np.ndarray]:
+    """Audio source reading a WAV file in fixed-size chunks, resampled to mono ``sample_rate``."""
+    rate, data = wavfile.read(path)
+    audio = to_float32(data)
+    if rate != sample_rate:
+        positions = np.arange(0, len(audio), rate / sample_rate)
+        audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+    step = sample_rate * chunk_ms // 1000
+    for start in range(0, len(audio), step):
+        yield audio[start:start + step]
+
+
+def microphone_chunks(max_seconds: float, chunk_ms: int = 100, sample_rate: int = SAMPLE_RATE) -> Iterator[np.ndarray]:
+    """Audio source reading the default microphone until ``max_seconds`` or until the consumer stops."""
+    import sounddevice as sd
+
+    chunks = queue.Queue()
+    blocksize = sample_rate * chunk_ms // 1000
+    with sd.InputStream(samplerate=sample_rate, channels=1, dtype="int16", blocksize=blocksize,
+                        callback=lambda data, frames, t, status: chunks.put(data[:, 0].copy())):
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            try:
+                yield chunks.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+
+def transcribe_source(transcriber: StreamingTranscriber, chunks: Iterator) -> tuple[Optional[dict], list[dict]]:
+    """Feeds an audio source until the first final transcript (or the source ends).
+
+    Returns the final event and every partial seen before it.
+    """
+    partials = []
+    for chunk in chunks:
+        for event in transcriber.feed(chunk):
+            if event["type"] == "final":
+                return event, partials
+            partials.append(event)
+    final = transcriber.flush()
+    return (final[0] if final else None), partials
@@ -0,0 +1,243 @@
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+
+# Local-only telemetry settings
+TRACE_HEADER = "X-Trace-Id"
+TRACE_FILE = os.getenv("TELEMETRY_TRACE_FILE")  # optional JSONL span export, one file per agent is fine
+SUMMARY_WINDOW = int(os.getenv("TELEMETRY_SUMMARY_WINDOW", "2048"))  # recent observations kept for quantiles
+RECENT_SPANS = int(os.getenv("TELEMETRY_RECENT_SPANS", "500"))
+TRACE_QUEUE_SIZE = int(os.getenv("TELEMETRY_TRACE_QUEUE", "10000"))  # spans waiting for the export writer
+QUANTILES = (0.5, 0.95, 0.99)
+
+trace_id_var = contextvars.ContextVar("trace_id", default=None)
+agent_name = "agent"
+
+
+def current_trace_id() -> Optional[str]:
+    return trace_id_var.get()
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _label_value(value) -> str:
+    """Label value escaped for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_label_value(value)}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines += [f"{self.name}{_label_text(key)} {value}" for key, value in self._values.items()]
+        return lines
+
+
+class Summary:
+    """Count, sum and p50/p95/p99 over the last SUMMARY_WINDOW observations, per label set."""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0, 0.0, deque(maxlen=SUMMARY_WINDOW)]
+            series[0] += 1
+            series[1] += value
+            series[2].append(value)
+
+    def quantiles(self, **labels) -> dict:
+        with self._lock:
+            series = self._series.get(tuple(sorted(labels.items())))
+            window = sorted(series[2]) if series else []
+        if not window:
+            return {}
+        return {q: window[min(len(window) - 1, int(q * len(window)))] for q in QUANTILES}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} summary"]
+        with self._lock:
+            snapshot = [(key, count, total, sorted(window)) for key, (count, total, window) in self._series.items()]
+        for key, count, total, window in snapshot:
+            for q in QUANTILES:
+                value = window[min(len(window) - 1, int(q * len(window)))] if window else float("nan")
+                lines.append(f"{self.name}{_label_text(key + (('quantile', q),))} {value}")
+            lines.append(f"{self.name}_sum{_label_text(key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(key)} {count}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time (index size, queue depth, ...)."""
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], float]):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception:
+            value = float("nan")
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _register(name, factory):
+    with _metrics_lock:
+        if name not in _metrics:
+            _metrics[name] = factory()
+        return _metrics[name]
+
+
+def counter(name: str, help_text: str = "") -> Counter:
+    return _register(name, lambda: Counter(name, help_text))
+
+
+def summary(name: str, help_text: str = "") -> Summary:
+    return _register(name, lambda: Summary(name, help_text))
+
+
+def gauge(name: str, help_text: str, fn: Callable[[], float]) -> Gauge:
+    return _register(name, lambda: Gauge(name, help_text, fn))
+
+
+def render_metrics() -> str:
+    with _metrics_lock:
+        metrics = list(_metrics.values())
+    lines = []
+    for metric in metrics:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+span_seconds = summary("agent_span_seconds", "Duration of instrumented stages by agent and span.")
+request_seconds = summary("agent_request_seconds", "HTTP request latency by agent, route and status.")
+spans_dropped = counter("telemetry_spans_dropped_total", "Spans not exported because the writer queue was full.")
+_recent_spans = deque(maxlen=RECENT_SPANS)
+_trace_queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+_trace_writer = None
+_trace_lock = threading.Lock()
+
+
+def _write_traces():
+    """Export thread: appends queued span records to TRACE_FILE, one write per batch."""
+    with open(TRACE_FILE, "a") as f:
+        while True:
+            records = [_trace_queue.get()]
+            try:
+                while len(records) < 1000:
+                    records.append(_trace_queue.get_nowait())
+            except queue.Empty:
+                pass
+            f.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+            f.flush()
+
+
+def _export(record: dict):
+    global _trace_writer
+    if _trace_writer is None:
+        with _trace_lock:
+            if _trace_writer is None:
+                _trace_writer = threading.Thread(target=_write_traces, name="trace-writer", daemon=True)
+                _trace_writer.start()
+    try:
+        _trace_queue.put_nowait(record)
+    except queue.Full:
+        spans_dropped.inc(agent=agent_name)
+
+
+def record_span(name: str, seconds: float, **attributes):
+    """Records a finished span: summary observation, recent-span buffer and optional JSONL export.
+
+    The export is written by a background thread, so callers on the event loop never touch the file.
+    """
+    span_seconds.observe(seconds, agent=agent_name, span=name)
+    record = {"trace_id": current_trace_id(), "agent": agent_name, "span": name,
+              "end": round(time.time(), 6), "duration_ms": round(seconds * 1000, 3), **attributes}
+    _recent_spans.append(record)
+    if TRACE_FILE:
+        _export(record)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Times the enclosed block (sync or async code) as a span of the current trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start, **attributes)
+
+
+def instrument(app: FastAPI, name: str):
+    """Adds trace-ID propagation, request timing, /metrics (Prometheus text) and /traces to an agent."""
+    global agent_name
+    agent_name = name
+
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        trace_id = request.headers.get(TRACE_HEADER) or new_trace_id()
+        token = trace_id_var.set(trace_id)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers[TRACE_HEADER] = trace_id
+            return response
+        finally:
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            if path not in ("/metrics", "/health", "/ready"):
+                request_seconds.observe(time.perf_counter() - start, agent=name, route=path,
+                                        method=request.method, status=status)
+            trace_id_var.reset(token)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return render_metrics()
+
+    @app.get("/traces")
+    async def traces(trace_id: Optional[str] = None, limit: int = 100):
+        spans = [s for s in list(_recent_spans) if trace_id is None or s["trace_id"] == trace_id]
+        return {"agent": name, "spans": spans[-limit:]}
@@ -0,0 +1,179 @@
+import hashlib
+import io
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import telemetry
+from sentences import sentences
+
+# Speech settings
+TTS_RATE = int(os.getenv("TTS_RATE", "150"))
+TTS_CACHE_MAX_ENTRIES = int(os.getenv("TTS_CACHE_MAX_ENTRIES", "512"))
+
+def concat_wavs(chunks: list[bytes]) -> bytes:
+    """Joins WAV files with identical formats into one WAV."""
+    out = io.BytesIO()
+    writer = None
+    for chunk in chunks:
+        with wave.open(io.BytesIO(chunk)) as reader:
+            if writer is None:
+                writer = wave.open(out, "wb")
+                writer.setparams(reader.getparams())
+            writer.writeframes(reader.readframes(reader.getnframes()))
+    if writer is not None:
+        writer.close()
+    return out.getvalue()
+
+
+class AudioCache:
+    """LRU of synthesized audio keyed by sentence text and voice settings."""
+
+    def __init__(self, max_entries: int = TTS_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(f"{TTS_RATE}|{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str, count: bool = True):
+        with self._lock:
+            audio = self._entries.get(self.key(text))
+            if audio is None:
+                self.misses += count
+                return None
+            self._entries.move_to_end(self.key(text))
+            self.hits += count
+            return audio
+
+    def put(self, text: str, audio: bytes):
+        with self._lock:
+            self._entries[self.key(text)] = audio
+            self._entries.move_to_end(self.key(text))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+
+class TTSWorker:
+    """One long-lived pyttsx3 engine on its own thread, fed from a job queue.
+
+    pyttsx3 engines are not thread-safe and are slow to create, so every job (synthesis to
+    WAV or playback on the local speakers) runs on this thread. pyttsx3 can only render to a
+    file, so audio goes through a private temp directory and is read back into memory.
+    """
+
+    def __init__(self, cache: AudioCache = None):
+        self.cache = cache if cache is not None else AudioCache()
+        self.jobs_done = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._tmpdir = None
+
+    def start(self):
+        if self._thread is None:
+            self._tmpdir = tempfile.mkdtemp(prefix="tts-")
+            self._thread = threading.Thread(target=self._run, name="tts-engine", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def _submit(self, kind: str, text: str) -> Future:
+        future = Future()
+        self._queue.put((kind, text, future, telemetry.current_trace_id(), time.perf_counter()))
+        return future
+
+    def synthesize(self, sentence: str) -> Future:
+        """Future resolving to WAV bytes for one sentence, served from the cache when possible."""
+        audio = self.cache.get(sentence)
+        if audio is not None:
+            future = Future()
+            future.set_result(audio)
+            return future
+        return self._submit("synthesize", sentence)
+
+    def synthesize_text(self, text: str) -> list[tuple[str, Future]]:
+        """Queues every sentence at once; callers consume the futures in order."""
+        return [(sentence, self.synthesize(sentence)) for sentence in sentences(text)]
+
+    def speak(self, text: str) -> Future:
+        """Queues playback on the local speakers; resolves once the text has been spoken."""
+        return self._submit("speak", text)
+
+    def _new_engine(self):
+        import pyttsx3
+
+        engine = pyttsx3.init()
+        engine.setProperty('rate', TTS_RATE)
+        return engine
+
+    def _render(self, engine, text: str) -> bytes:
+        fd, path = tempfile.mkstemp(suffix=".wav", dir=self._tmpdir)
+        os.close(fd)
+        try:
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+    def _run(self):
+        try:
+            engine = self._new_engine()
+        except Exception as e:
+            print(f"TTS engine failed to start, retrying on the first job: {str(e)}")
+            engine = None
+        while True:
+            job = self._queue.get()
+            if job is None:
+                if engine is not None:
+                    engine.stop()
+                return
+            kind, text, future, trace_id, queued_at = job
+            if kind == "synthesize":
+                cached = self.cache.get(text, count=False)  # an identical sentence may have been queued twice
+                if cached is not None:
+                    future.set_result(cached)
+                    continue
+            token = telemetry.trace_id_var.set(trace_id)
+            started = time.perf_counter()
+            try:
+                if engine is None:
+                    engine = self._new_engine()
+                if kind == "synthesize":
+                    audio = self._render(engine, text)
+                    self.cache.put(text, audio)
+                    future.set_result(audio)
+                else:
+                    engine.say(text)
+                    engine.runAndWait()
+                    future.set_result(None)
+                self.jobs_done += 1
+            except Exception as e:
+                engine = None  # start from a fresh engine on the next job
+                future.set_exception(e)
+            finally:
+                telemetry.record_span(f"tts_{kind}", time.perf_counter() - started,
+                                      queued_ms=round((started - queued_at) * 1000, 1), chars=len(text))
+                telemetry.trace_id_var.reset(token)
+
+    def stats(self):
+        return {"queue_depth": self._queue.qsize(), "jobs_done": self.jobs_done, "cache": self.cache.stats()}
@@ -0,0 +1,58 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from fastapi import HTTPException
+
+import telemetry
+
+# Per-upstream concurrency caps and timeout for blocking market-data clients
+UPSTREAM_LIMITS = {
+    "yfinance": int(os.getenv("YFINANCE_CONCURRENCY", "8")),
+    "finnhub": int(os.getenv("FINNHUB_CONCURRENCY", "4")),
+}
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "15"))
+
+executor = ThreadPoolExecutor(max_workers=sum(UPSTREAM_LIMITS.values()), thread_name_prefix="upstream")
+_semaphores = {}
+
+
+def limit(upstream: str) -> asyncio.Semaphore:
+    if upstream not in _semaphores:
+        _semaphores[upstream] = asyncio.Semaphore(UPSTREAM_LIMITS[upstream])
+    return _semaphores[upstream]
+
+
+async def run_blocking(upstream: str, fn, *args, **kwargs):
+    """Runs a blocking upstream call on the shared executor, bounded per upstream and by UPSTREAM_TIMEOUT.
+
+    A timed-out call keeps its worker thread until the library returns, but the request
+    gets a 504 right away.
+    """
+    async with limit(upstream):
+        loop = asyncio.get_running_loop()
+        call = partial(contextvars.copy_context().run, fn, *args, **kwargs)  # keeps the trace ID in the worker
+        try:
+            with telemetry.span(f"upstream:{upstream}"):
+                return await asyncio.wait_for(loop.run_in_executor(executor, call), UPSTREAM_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"{upstream} did not respond within {UPSTREAM_TIMEOUT}s.")
+
+
+async def with_limit(upstream: str, coro):
+    """Awaits an async upstream call under the same per-upstream limit and timeout."""
+    async with limit(upstream):
+        try:
+            with telemetry.span(f"upstream:{upstream}"):
+                return await asyncio.wait_for(coro, UPSTREAM_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"{upstream} did not respond within {UPSTREAM_TIMEOUT}s.")
+
+
+def stats():
+    return {
+        name: {"limit": UPSTREAM_LIMITS[name], "available": sem._value}
+        for name, sem in _semaphores.items()
+    }
@@ -0,0 +1,790 @@
+import heapq
+import json
+import os
+import pickle
+import threading
+import time
+
+import faiss
+import numpy as np
+
+from embedder import content_hash
+
+# Retriever persistence settings
+DATA_DIR = os.getenv("RETRIEVER_DATA_DIR", ".")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "384"))
+SNAPSHOT_EVERY_DOCS = int(os.getenv("SNAPSHOT_EVERY_DOCS", "1000"))
+SNAPSHOT_GROWTH = float(os.getenv("SNAPSHOT_GROWTH", "0.1"))  # and not before the index grew by this fraction
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "60"))
+FSYNC_WRITES = os.getenv("RETRIEVER_FSYNC", "0") == "1"
+
+# ANN index settings; trained types serve from a flat index until TRAIN_MIN_VECTORS exist.
+# fp16 and sq8 scan every vector like flat but hold 2 bytes / 1 byte per dimension instead of 4;
+# ivf_pq is the product-quantized option (about PQ_M bytes per vector)
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "fp16", "sq8")
+INDEX_TYPE = os.getenv("RETRIEVER_INDEX_TYPE", "flat")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 picks ~4*sqrt(n) at training time
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+PQ_M = int(os.getenv("PQ_M", "48"))
+PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+TRAIN_MIN_VECTORS = int(os.getenv("TRAIN_MIN_VECTORS", "5000"))
+
+# Document lifecycle: TTL per source agent (seconds, 0 = never expires), size cap and compaction
+DEFAULT_TTL_SECONDS = float(os.getenv("DOC_TTL_SECONDS", "0"))
+SOURCE_TTL_SECONDS = {
+    "orchestrator": float(os.getenv("DOC_TTL_ORCHESTRATOR", "900")),
+    "api_agent": float(os.getenv("DOC_TTL_API_AGENT", "900")),
+    "scraper": float(os.getenv("DOC_TTL_SCRAPER", "86400")),
+}
+MAX_DOCUMENTS = int(os.getenv("RETRIEVER_MAX_DOCUMENTS", "0"))  # 0 = unbounded
+COMPACT_MIN_DEAD = int(os.getenv("COMPACT_MIN_DEAD", "1000"))
+COMPACT_DEAD_RATIO = float(os.getenv("COMPACT_DEAD_RATIO", "0.2"))
+
+# Filtered queries matching at most this many documents are answered by exact search over just those vectors
+EXACT_FILTER_MAX = int(os.getenv("EXACT_FILTER_MAX", "4096"))
+
+LOG_FILE = "documents.log"
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "faiss.index"
+SNAPSHOT_META_FILE = "snapshot.json"
+COMPACT_MARKER_FILE = "compact.json"
+LEGACY_DOCUMENTS_FILE = "documents.pkl"
+
+
+def needs_training(index_type: str) -> bool:
+    return index_type in ("ivf_flat", "ivf_pq", "sq8")
+
+
+def build_index(index_type: str, dim: int, n_vectors: int = 0):
+    """Creates an empty index of the given type; IVF and sq8 indexes still need ``train``."""
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+    if index_type == "fp16":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    if index_type == "sq8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    nlist = IVF_NLIST or max(16, min(65536, int(4 * np.sqrt(max(n_vectors, 1)))))
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+    elif index_type == "ivf_pq":
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_M, PQ_NBITS)
+    else:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}.")
+    index.nprobe = IVF_NPROBE
+    return index
+
+
+def index_type_of(index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+
+def search_params(index, nprobe=None, ef_search=None, sel=None):
+    index_type = index_type_of(index)
+    if index_type in ("ivf_flat", "ivf_pq") and (nprobe or sel is not None):
+        params = faiss.SearchParametersIVF(nprobe=nprobe or faiss.downcast_index(index).nprobe)
+    elif index_type == "hnsw" and (ef_search or sel is not None):
+        params = faiss.SearchParametersHNSW(efSearch=ef_search or faiss.downcast_index(index).hnsw.efSearch)
+    elif sel is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if sel is not None:
+        params.sel = sel
+    return params
+
+
+def document_hash(text: str) -> str:
+    """Content hash used for ingest dedup; whitespace differences do not make a new document."""
+    return content_hash(" ".join(text.split()))
+
+
+def expiry_for(source, timestamp, ttl_seconds=None):
+    ttl = ttl_seconds if ttl_seconds is not None else SOURCE_TTL_SECONDS.get(source, DEFAULT_TTL_SECONDS)
+    return timestamp + ttl if ttl else None
+
+
+def make_record(doc_id: int, text: str, meta: dict, now: float = None) -> dict:
+    """Builds the documents.log record for a document from its (request or stored) metadata."""
+    timestamp = meta.get("timestamp") or now
+    source = meta.get("source")
+    ticker = meta.get("ticker")
+    expires_at = meta["expires_at"] if "expires_at" in meta else expiry_for(source, timestamp, meta.get("ttl_seconds"))
+    return {
+        "id": doc_id,
+        "text": text,
+        "hash": meta.get("hash") or document_hash(text),
+        "ticker": ticker.upper() if ticker else None,
+        "source": source,
+        "timestamp": timestamp,
+        "expires_at": expires_at,
+    }
+
+
+def record_metadata(record: dict) -> dict:
+    return {
+        "hash": record.get("hash") or document_hash(record["text"]),
+        "ticker": record.get("ticker"),
+        "source": record.get("source"),
+        "timestamp": record.get("timestamp"),
+        "expires_at": record.get("expires_at"),
+    }
+
+
+def train_index(index_type: str, vectors: np.ndarray):
+    """Builds a populated index of ``index_type`` over ``vectors``."""
+    index = build_index(index_type, vectors.shape[1], len(vectors))
+    if needs_training(index_type):
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+class VectorStore:
+    """FAISS index plus document texts and metadata, persisted as an append-only log with background index snapshots.
+
+    Every ingest appends its raw float32 vectors to ``vectors.f32`` and one JSON record per
+    document to ``documents.log``; the document id is its row in ``vectors.f32`` and its
+    FAISS label. The log also carries ``touch`` and ``delete`` records for re-ingested and
+    evicted documents. The index itself is only written by the background thread, which
+    also trains IVF indexes and compacts dead vectors away; startup replays the vectors that
+    arrived after the last snapshot.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR, dim: int = EMBEDDING_DIM, index_type: str = INDEX_TYPE):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}.")
+        self.data_dir = data_dir
+        self.dim = dim
+        self.index_type = index_type
+        self.index = None
+        self.documents = []
+        self.metadata = []
+        self.hashes = {}
+        self.by_ticker = {}
+        self.by_source = {}
+        self.dead = set()
+        self.snapshot_ntotal = 0
+        self.compactions = 0
+        self._expiry_heap = []
+        self._evict_cursor = 0
+        self._dead_selector = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._log = None
+        self._vectors = None
+        self._compact_ops = None
+
+    def _path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal if self.index is not None else 0
+
+    @property
+    def live_count(self):
+        return len(self.documents) - len(self.dead)
+
+    def open(self):
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._finish_compaction()
+        if not os.path.exists(self._path(LOG_FILE)):
+            self._import_legacy()
+        self._load()
+        self._open_files()
+        self._thread = threading.Thread(target=self._run_maintenance, name="index-maintenance", daemon=True)
+        self._thread.start()
+        if self.needs_rebuild:
+            self._wakeup.set()
+
+    def close(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.snapshot(force=True)
+        self._close_files()
+
+    def _open_files(self):
+        self._log = open(self._path(LOG_FILE), "a", encoding="utf-8")
+        self._vectors = open(self._path(VECTORS_FILE), "ab")
+
+    def _close_files(self):
+        for f in (self._log, self._vectors):
+            if f is not None:
+                f.close()
+        self._log = self._vectors = None
+
+    def _new_index(self):
+        if needs_training(self.index_type):
+            return build_index("flat", self.dim)
+        return build_index(self.index_type, self.dim)
+
+    @property
+    def needs_rebuild(self):
+        """True while the index is not of the configured type: a snapshot of another type, or a
+        flat interim index that now has enough vectors to train on."""
+        return self.index is not None and index_type_of(self.index) != self._target_index_type(self.ntotal)
+
+    def _import_legacy(self):
+        """Converts a pre-log documents.pkl / faiss.index pair into the log format."""
+        try:
+            with open(self._path(LEGACY_DOCUMENTS_FILE), "rb") as f:
+                documents = pickle.load(f)
+            index = faiss.read_index(self._path(INDEX_FILE))
+        except Exception:
+            return
+        count = min(len(documents), index.ntotal)
+        vectors = index.reconstruct_n(0, count).astype("float32")
+        with open(self._path(VECTORS_FILE), "wb") as f:
+            f.write(vectors.tobytes())
+        with open(self._path(LOG_FILE), "w", encoding="utf-8") as f:
+            for doc_id, text in enumerate(documents[:count]):
+                f.write(json.dumps(make_record(doc_id, text, {}, time.time())) + "\n")
+        print(f"Imported {count} legacy documents into the document log.")
+
+    def _read_vectors(self, start: int, stop: int) -> np.ndarray:
+        path = self._path(VECTORS_FILE)
+        if stop <= start or not os.path.exists(path):
+            return np.empty((0, self.dim), dtype="float32")
+        rows = np.memmap(path, dtype="float32", mode="r").reshape(-1, self.dim)
+        return np.array(rows[start:stop])
+
+    def _load(self):
+        vectors_path = self._path(VECTORS_FILE)
+        n_vectors = os.path.getsize(vectors_path) // (4 * self.dim) if os.path.exists(vectors_path) else 0
+
+        documents, metadata, ops = [], [], []
+        log_path = self._path(LOG_FILE)
+        good_bytes = 0
+        if os.path.exists(log_path):
+            with open(log_path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn write at the tail of the log
+                    if "op" in record:
+                        ops.append(record)
+                    elif len(documents) < n_vectors:
+                        documents.append(record["text"])
+                        metadata.append(record_metadata(record))
+                    else:
+                        break  # vector row never made it to disk
+                    good_bytes += len(line)
+            if good_bytes != os.path.getsize(log_path):
+                with open(log_path, "r+b") as f:
+                    f.truncate(good_bytes)
+        count = len(documents)
+        if n_vectors != count:
+            with open(vectors_path, "r+b") as f:
+                f.truncate(count * 4 * self.dim)
+
+        for op in ops:
+            doc_id = op["id"]
+            if doc_id >= count:
+                continue
+            if op["op"] == "touch":
+                metadata[doc_id]["timestamp"] = op["timestamp"]
+                metadata[doc_id]["expires_at"] = op.get("expires_at")
+            elif op["op"] == "delete":
+                self.dead.add(doc_id)
+        self.documents = documents
+        self.metadata = metadata
+        self._rebuild_lookups()
+        self._expire(time.time())
+
+        index = None
+        try:
+            with open(self._path(SNAPSHOT_META_FILE)) as f:
+                snapshot_ntotal = json.load(f)["ntotal"]
+            if snapshot_ntotal <= count:
+                index = faiss.read_index(self._path(INDEX_FILE))
+                if index.ntotal != snapshot_ntotal:
+                    index = None
+        except Exception:
+            index = None
+        if index is None:
+            index = self._new_index()
+        self.snapshot_ntotal = index.ntotal
+
+        replayed = count - index.ntotal
+        for start in range(index.ntotal, count, 100_000):  # chunked, so a compressed index never sees the full float32 copy
+            index.add(self._read_vectors(start, min(count, start + 100_000)))
+        self.index = index
+        print(f"Loaded {count} documents ({replayed} replayed from the log since the last snapshot, "
+              f"{len(self.dead)} dead).")
+        if self.needs_rebuild:
+            # serve from the snapshot meanwhile; the maintenance thread converts it
+            print(f"Index is {index_type_of(index)}, configured {self.index_type}; rebuilding in the background.")
+
+    def _rebuild_lookups(self):
+        """Recomputes the hash map, metadata postings and expiry heap from ``metadata`` and ``dead``."""
+        self.hashes = {}
+        self.by_ticker = {}
+        self.by_source = {}
+        self._expiry_heap = []
+        for doc_id, meta in enumerate(self.metadata):
+            if doc_id in self.dead:
+                continue
+            self._index_metadata(doc_id, meta)
+            if meta.get("expires_at") is not None:
+                self._expiry_heap.append((meta["expires_at"], doc_id))
+        heapq.heapify(self._expiry_heap)
+        self._evict_cursor = 0
+        self._dead_selector = None
+
+    def _index_metadata(self, doc_id, meta):
+        self.hashes[meta["hash"]] = doc_id
+        if meta.get("ticker"):
+            self.by_ticker.setdefault(meta["ticker"], set()).add(doc_id)
+        if meta.get("source"):
+            self.by_source.setdefault(meta["source"], set()).add(doc_id)
+
+    def _append_ops(self, ops):
+        self._log.write("".join(json.dumps(op) + "\n" for op in ops))
+        self._log.flush()
+        if self._compact_ops is not None:
+            self._compact_ops.extend(op for op in ops if op.get("op") == "touch")
+
+    def _mark_dead(self, doc_id):
+        self.dead.add(doc_id)
+        self._dead_selector = None
+        meta = self.metadata[doc_id]
+        if self.hashes.get(meta["hash"]) == doc_id:
+            del self.hashes[meta["hash"]]
+        if meta.get("ticker"):
+            self.by_ticker.get(meta["ticker"], set()).discard(doc_id)
+        if meta.get("source"):
+            self.by_source.get(meta["source"], set()).discard(doc_id)
+
+    def _expire(self, now):
+        """Marks documents whose TTL has passed as dead. Caller holds the lock."""
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, doc_id = heapq.heappop(heap)
+            if doc_id not in self.dead and self.metadata[doc_id].get("expires_at") == expires_at:
+                self._mark_dead(doc_id)
+
+    def _evict_overflow(self):
+        """Deletes the oldest live documents beyond MAX_DOCUMENTS. Caller holds the lock."""
+        if not MAX_DOCUMENTS or self.live_count <= MAX_DOCUMENTS:
+            return
+        evicted = []
+        while self.live_count > MAX_DOCUMENTS and self._evict_cursor < len(self.documents):
+            doc_id = self._evict_cursor
+            self._evict_cursor += 1
+            if doc_id not in self.dead:
+                self._mark_dead(doc_id)
+                evicted.append({"op": "delete", "id": doc_id})
+        if evicted:
+            self._append_ops(evicted)
+
+    def _touch_or_select(self, texts, metadatas, rows, now):
+        """Refreshes the TTL of rows whose text is already stored and returns the remaining new rows.
+
+        Caller holds the lock.
+        """
+        new_rows, seen, ops = [], set(), []
+        for row in rows:
+            key = document_hash(texts[row])
+            doc_id = self.hashes.get(key)
+            if doc_id is None:
+                if key not in seen:
+                    seen.add(key)
+                    new_rows.append(row)
+                continue
+            meta = metadatas[row]
+            stored = self.metadata[doc_id]
+            stored["timestamp"] = meta.get("timestamp") or now
+            stored["expires_at"] = expiry_for(stored["source"], stored["timestamp"], meta.get("ttl_seconds"))
+            if stored["expires_at"] is not None:
+                heapq.heappush(self._expiry_heap, (stored["expires_at"], doc_id))
+            ops.append({"op": "touch", "id": doc_id, "timestamp": stored["timestamp"],
+                        "expires_at": stored["expires_at"]})
+        if ops:
+            self._append_ops(ops)
+        return new_rows
+
+    def add(self, texts: list[str], embed, metadatas=None):
+        """Stores new documents; texts already stored (by content hash) only have their TTL refreshed.
+
+        ``embed`` is called outside the lock with just the new texts and must return their
+        vectors. Returns the number of documents added.
+        """
+        now = time.time()
+        metadatas = metadatas or [{}] * len(texts)
+        with self._lock:
+            self._expire(now)
+            new_rows = self._touch_or_select(texts, metadatas, range(len(texts)), now)
+        if not new_rows:
+            return 0
+        embeddings = np.ascontiguousarray(embed([texts[row] for row in new_rows]), dtype="float32")
+        embeddings = embeddings.reshape(-1, self.dim)
+        embedding_of = dict(zip(new_rows, embeddings))
+
+        with self._lock:
+            # another request may have stored some of these texts while we were embedding
+            new_rows = self._touch_or_select(texts, metadatas, new_rows, now)
+            if new_rows:
+                embeddings = np.stack([embedding_of[row] for row in new_rows])
+                start = len(self.documents)
+                records = [make_record(start + i, texts[row], metadatas[row], now) for i, row in enumerate(new_rows)]
+                self._vectors.write(embeddings.tobytes())
+                self._vectors.flush()
+                self._append_ops(records)
+                if FSYNC_WRITES:
+                    os.fsync(self._vectors.fileno())
+                    os.fsync(self._log.fileno())
+                self.index.add(embeddings)
+                for record in records:
+                    self.documents.append(record["text"])
+                    meta = record_metadata(record)
+                    self.metadata.append(meta)
+                    self._index_metadata(record["id"], meta)
+                    if meta["expires_at"] is not None:
+                        heapq.heappush(self._expiry_heap, (meta["expires_at"], record["id"]))
+                self._evict_overflow()
+            wake = (self._snapshot_due()
+                    or self.needs_rebuild
+                    or self._should_compact())
+        if wake:
+            self._wakeup.set()
+        return len(new_rows)
+
+    def _filter_ids(self, tickers=None, sources=None, start=None, end=None):
+        """Returns the live document ids matching every given filter, or None when unfiltered.
+
+        Caller holds the lock.
+        """
+        candidates = None
+        if tickers:
+            candidates = set().union(*(self.by_ticker.get(t.upper(), set()) for t in tickers))
+        if sources:
+            by_source = set().union(*(self.by_source.get(source, set()) for source in sources))
+            candidates = by_source if candidates is None else candidates & by_source
+        if start is None and end is None:
+            return candidates
+        if candidates is None:
+            candidates = (doc_id for doc_id in range(len(self.metadata)) if doc_id not in self.dead)
+        lower = start if start is not None else float("-inf")
+        upper = end if end is not None else float("inf")
+        return {doc_id for doc_id in candidates if lower <= (self.metadata[doc_id]["timestamp"] or 0) < upper}
+
+    def search(self, query_embedding: np.ndarray, top_k: int, nprobe: int = None, ef_search: int = None,
+               tickers=None, sources=None, start: float = None, end: float = None):
+        """Nearest live documents to ``query_embedding``, optionally restricted by ticker, source and timestamp range.
+
+        Small filtered sets are searched exactly over their own vectors; larger ones go through
+        the ANN index with an ID selector. Returns dicts with the text, metadata and distance.
+        """
+        with self._lock:
+            self._expire(time.time())
+            allowed = self._filter_ids(tickers, sources, start, end)
+            if allowed is not None and len(allowed) <= EXACT_FILTER_MAX:
+                ids = np.fromiter(allowed, dtype="int64", count=len(allowed))
+                if len(ids) == 0:
+                    return []
+                ids.sort()
+                vectors = np.memmap(self._path(VECTORS_FILE), dtype="float32", mode="r").reshape(-1, self.dim)[ids]
+                distances = ((vectors - query_embedding[0]) ** 2).sum(axis=1)
+                order = np.argsort(distances)[:top_k]
+                hits = zip(distances[order], ids[order])
+            else:
+                if allowed is not None:
+                    sel = faiss.IDSelectorBatch(np.fromiter(allowed, dtype="int64", count=len(allowed)))
+                else:
+                    if self._dead_selector is None and self.dead:
+                        # keep the batch selector referenced alongside the Not wrapper that points at it
+                        dead_batch = faiss.IDSelectorBatch(np.fromiter(self.dead, dtype="int64", count=len(self.dead)))
+                        self._dead_selector = (faiss.IDSelectorNot(dead_batch), dead_batch)
+                    sel = self._dead_selector[0] if self._dead_selector is not None else None
+                params = search_params(self.index, nprobe, ef_search, sel=sel)
+                distances, indices = self.index.search(query_embedding, top_k, params=params)
+                hits = zip(distances[0], indices[0])
+            return [
+                dict(self.metadata[idx], id=int(idx), text=self.documents[idx], distance=float(distance))
+                for distance, idx in hits
+                if 0 <= idx < len(self.documents) and idx not in self.dead
+            ]
+
+    def _snapshot_due(self):
+        """Snapshots are paced by index growth, so their O(corpus) copy stays a fixed share of ingest work."""
+        if self.snapshot_ntotal < 0:
+            return True
+        pending = self.ntotal - self.snapshot_ntotal
+        return pending > 0 and pending >= max(SNAPSHOT_EVERY_DOCS, SNAPSHOT_GROWTH * self.snapshot_ntotal)
+
+    def _remove_snapshot(self):
+        for name in (SNAPSHOT_META_FILE, INDEX_FILE):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+
+    def snapshot(self, force: bool = False):
+        """Checkpoints the index to disk once it has grown enough since the last snapshot (or always with ``force``).
+
+        Flat indexes are not written at all: replaying ``vectors.f32`` rebuilds them as fast as
+        reading a snapshot. Other types are copied under the lock and serialized outside it.
+        """
+        with self._lock:
+            if self.index is None or self.ntotal == self.snapshot_ntotal or not (force or self._snapshot_due()):
+                return
+            if index_type_of(self.index) == "flat":
+                self._remove_snapshot()  # an older snapshot would only slow the next startup down
+                self.snapshot_ntotal = self.ntotal
+                return
+            index = faiss.clone_index(self.index)
+        tmp_path = self._path(INDEX_FILE + ".tmp")
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, self._path(INDEX_FILE))
+        with open(self._path(SNAPSHOT_META_FILE + ".tmp"), "w") as f:
+            json.dump({"ntotal": index.ntotal, "created": time.time()}, f)
+        os.replace(self._path(SNAPSHOT_META_FILE + ".tmp"), self._path(SNAPSHOT_META_FILE))
+        self.snapshot_ntotal = index.ntotal
+
+    def _target_index_type(self, n_vectors):
+        if needs_training(self.index_type) and n_vectors < TRAIN_MIN_VECTORS:
+            return "flat"
+        return self.index_type
+
+    def _build_from_log(self, index_type: str, count: int, chunk: int = 100_000):
+        """Index of ``index_type`` over the first ``count`` stored vectors.
+
+        Types that need no training (flat, hnsw, fp16) are filled chunk by chunk from
+        ``vectors.f32``, so converting a store to fp16 never holds a float32 copy of the whole
+        corpus next to the compressed index.
+        """
+        if needs_training(index_type):
+            return train_index(index_type, self._read_vectors(0, count))
+        index = build_index(index_type, self.dim)
+        for start in range(0, count, chunk):
+            index.add(self._read_vectors(start, min(count, start + chunk)))
+        return index
+
+    def train(self, index_type: str = None):
+        """Replaces the current index (interim flat, or a snapshot of another type) with one of the configured type.
+
+        Training and bulk insertion run outside the lock; vectors ingested meanwhile are
+        added from the log before the swap. ``index_type`` overrides the type to build.
+        """
+        with self._lock:
+            count = self.ntotal
+        index_type = index_type or self._target_index_type(count)
+        index = self._build_from_log(index_type, count)
+        with self._lock:
+            index.add(self._read_vectors(count, self.ntotal))
+            self.index = index
+            self._dead_selector = None
+        self.snapshot_ntotal = -1  # force a snapshot of the new index type
+        print(f"Built {index_type} index over {count} vectors.")
+
+    def _should_compact(self):
+        return len(self.dead) >= COMPACT_MIN_DEAD and len(self.dead) >= COMPACT_DEAD_RATIO * len(self.documents)
+
+    def _finish_compaction(self):
+        """Completes a compaction interrupted after its commit marker was written, or discards one interrupted before."""
+        pairs = [(self._path(name + ".compact"), self._path(name)) for name in (VECTORS_FILE, LOG_FILE)]
+        if os.path.exists(self._path(COMPACT_MARKER_FILE)):
+            for tmp_path, path in pairs:
+                if os.path.exists(tmp_path):
+                    os.replace(tmp_path, path)
+            os.remove(self._path(COMPACT_MARKER_FILE))
+            print("Finished an interrupted compaction.")
+        for tmp_path, _ in pairs:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def compact(self):
+        """Rewrites the log and vectors without dead documents and rebuilds the index over the survivors.
+
+        The rewrite and rebuild run outside the lock; documents ingested, touched or killed
+        meanwhile are carried over before the new files and index are swapped in behind a
+        commit marker, which ``open`` rolls forward after a crash.
+        """
+        with self._lock:
+            self._expire(time.time())
+            count = len(self.documents)
+            dead_before = set(self.dead)
+            self._compact_ops = []
+        try:
+            live = [doc_id for doc_id in range(count) if doc_id not in dead_before]
+            vectors = self._read_vectors(0, count)[live]
+            index = train_index(self._target_index_type(len(live)), vectors)
+            documents = [self.documents[doc_id] for doc_id in live]
+            metadata = [self.metadata[doc_id] for doc_id in live]
+
+            log_tmp = self._path(LOG_FILE + ".compact")
+            vectors_tmp = self._path(VECTORS_FILE + ".compact")
+            with open(log_tmp, "w", encoding="utf-8") as f:
+                for new_id, meta in enumerate(metadata):
+                    f.write(json.dumps(make_record(new_id, documents[new_id], meta)) + "\n")
+            with open(vectors_tmp, "wb") as f:
+                f.write(vectors.tobytes())
+
+            with self._lock:
+                self._expire(time.time())
+                tail = list(range(count, len(self.documents)))
+                old_ids = live + tail
+                new_ids = {old_id: new_id for new_id, old_id in enumerate(old_ids)}
+                tail_vectors = self._read_vectors(count, len(self.documents))
+                if tail:
+                    index.add(tail_vectors)
+                with open(log_tmp, "a", encoding="utf-8") as f:
+                    for new_id, old_id in enumerate(tail, start=len(live)):
+                        f.write(json.dumps(make_record(new_id, self.documents[old_id], self.metadata[old_id])) + "\n")
+                    for op in self._compact_ops:
+                        if op["id"] in new_ids:
+                            f.write(json.dumps(dict(op, id=new_ids[op["id"]])) + "\n")
+                    for old_id in self.dead - dead_before:
+                        if old_id in new_ids:
+                            f.write(json.dumps({"op": "delete", "id": new_ids[old_id]}) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                with open(vectors_tmp, "ab") as f:
+                    f.write(tail_vectors.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                # the old snapshot's labels use the old numbering; the marker makes the two renames one step
+                self._close_files()
+                self._remove_snapshot()
+                with open(self._path(COMPACT_MARKER_FILE), "w") as f:
+                    json.dump({"documents": len(old_ids), "created": time.time()}, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(vectors_tmp, self._path(VECTORS_FILE))
+                os.replace(log_tmp, self._path(LOG_FILE))
+                os.remove(self._path(COMPACT_MARKER_FILE))
+                self._open_files()
+
+                removed = len(self.documents) - len(old_ids)
+                self.dead = {new_ids[old_id] for old_id in self.dead - dead_before if old_id in new_ids}
+                self.documents = documents + [self.documents[old_id] for old_id in tail]
+                self.metadata = metadata + [self.metadata[old_id] for old_id in tail]
+                self.index = index
+                self._rebuild_lookups()
+                self.snapshot_ntotal = -1
+                self.compactions += 1
+        finally:
+            with self._lock:
+                self._compact_ops = None
+        print(f"Compacted document store: removed {removed} dead documents, {len(old_ids)} remain.")
+
+    def _run_maintenance(self):
+        while not self._stopping:
+            self._wakeup.wait(SNAPSHOT_INTERVAL)
+            self._wakeup.clear()
+            if self._stopping:
+                return
+            try:
+                with self._lock:
+                    self._expire(time.time())
+                    compact = self._should_compact()
+                if compact:
+                    self.compact()
+                elif self.needs_rebuild:
+                    self.train()
+                self.snapshot()
+            except Exception as e:
+                print(f"Index maintenance failed: {e}")
+
+    def stats(self):
+        return {
+            "documents": len(self.documents),
+            "live_documents": self.live_count,
+            "dead_documents": len(self.dead),
+            "compactions": self.compactions,
+            "index_ntotal": self.ntotal,
+            "snapshot_ntotal": self.snapshot_ntotal,
+            "index_type": index_type_of(self.index) if self.index is not None else None,
+            "configured_index_type": self.index_type,
+        }
+
+    def recall_report(self, sample_queries: int = 200, top_k: int = 10, max_vectors: int = 200000, index_types=INDEX_TYPES):
+        """Measures recall@k and search latency of each index type against exact flat search.
+
+        Builds each candidate over (up to ``max_vectors`` of) the stored vectors and queries
+        it with stored vectors, sweeping nprobe / efSearch.
+        """
+        with self._lock:
+            count = min(len(self.documents), max_vectors)
+            live = [doc_id for doc_id in range(count) if doc_id not in self.dead]
+        vectors = self._read_vectors(0, count)[live]
+        count = len(vectors)
+        if count == 0:
+            return {"vectors": 0, "results": []}
+        rng = np.random.default_rng(0)
+        queries = vectors[rng.choice(count, size=min(sample_queries, count), replace=False)]
+        return {"vectors": count, "queries": len(queries), "top_k": top_k,
+                "results": recall_report(vectors, queries, top_k, index_types)}
+
+
+def _timed_search(index, queries, top_k, params=None):
+    start = time.perf_counter()
+    _, indices = index.search(queries, top_k, params=params)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return indices, elapsed_ms / len(queries)
+
+
+def bytes_per_vector(index) -> float:
+    """Serialized index size per stored vector, a close proxy for its resident memory."""
+    return round(faiss.serialize_index(index).nbytes / max(index.ntotal, 1), 1)
+
+
+def recall_report(vectors: np.ndarray, queries: np.ndarray, top_k: int = 10, index_types=INDEX_TYPES):
+    flat = train_index("flat", vectors)
+    truth, flat_ms = _timed_search(flat, queries, top_k)
+    truth_sets = [set(row) for row in truth]
+    results = [{"index_type": "flat", "recall": 1.0, "latency_ms_per_query": round(flat_ms, 4),
+                "bytes_per_vector": bytes_per_vector(flat)}]
+
+    sweeps = {"ivf_flat": ("nprobe", [1, 4, 8, 16, 32, 64]),
+              "ivf_pq": ("nprobe", [1, 4, 8, 16, 32, 64]),
+              "hnsw": ("ef_search", [16, 32, 64, 128, 256])}
+    for index_type in index_types:
+        if index_type == "flat":
+            continue
+        if needs_training(index_type) and len(vectors) < 2 ** PQ_NBITS:
+            results.append({"index_type": index_type, "error": "Not enough vectors to train."})
+            continue
+        build_start = time.perf_counter()
+        index = train_index(index_type, vectors)
+        build_s = time.perf_counter() - build_start
+        size = bytes_per_vector(index)
+        param_name, values = sweeps.get(index_type, (None, [None]))  # exhaustive types have nothing to sweep
+        for value in values:
+            params = search_params(index, **{param_name: value}) if param_name else None
+            found, latency_ms = _timed_search(index, queries, top_k, params)
+            hits = sum(len(truth_set & set(row)) for truth_set, row in zip(truth_sets, found))
+            result = {"index_type": index_type}
+            if param_name:
+                result[param_name] = value
+            results.append(dict(
+                result,
+                recall=round(hits / (len(queries) * top_k), 4),
+                latency_ms_per_query=round(latency_ms, 4),
+                build_seconds=round(build_s, 2),
+                bytes_per_vector=size,
+            ))
+    return results
@@ -1,64 +1,131 @@
-# stt_agent.py
-
-import sounddevice as sd
-from scipy.io.wavfile import write
-from faster_whisper import WhisperModel
-import tempfile
-import numpy as np
-import uvicorn
-import requests
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-
-# Initialize FastAPI app
-app = FastAPI()
-
-# CORS for allowing requests from orchestrator/frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # change to specific IP/port in production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Load Whisper model (choose base/small for speed)
-model = WhisperModel("base", device="cpu")
-
-# Audio config
-SAMPLE_RATE = 16000
-DURATION = 7  # seconds
-
-# Orchestrator endpoint to POST results to
-ORCHESTRATOR_URL = "http://localhost:8000/receive_transcription"
-
-@app.get("/stt")
-def record_and_transcribe():
-    try:
-        print("🎙️ Listening from mic...")
-        recording = sd.rec(int(DURATION * SAMPLE_RATE), samplerate=SAMPLE_RATE, channels=1, dtype='int16')
-        sd.wait()
-
-        # Save to temp .wav file
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmpfile:
-            write(tmpfile.name, SAMPLE_RATE, recording)
-            wav_path = tmpfile.name
-
-        print("📼 Transcribing...")
-        segments, _ = model.transcribe(wav_path)
-        transcription = " ".join([seg.text for seg in segments])
-
-        print(f"📝 Transcribed: {transcription}")
-
-        # Send transcription to orchestrator
-        response = requests.post(ORCHESTRATOR_URL, json={"transcription": transcription})
-        print(f"📨 Sent to orchestrator, response: {response.status_code}")
-
-        return {"message": "Transcription complete", "sent": True}
-
-    except Exception as e:
-        return {"error": str(e)}
-    
-# Run this file
-if __name__ == "__main__":
-    uvicorn.run("voice_agent:app", host="0.0.0.0", port=8001, reload=True)
+# stt_agent.py
+
+import asyncio
+import os
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+
+import http_client
+import telemetry
+from model_lifecycle import LazyModel, add_lifecycle_routes
+from stt_stream import StreamingTranscriber, file_chunks, microphone_chunks, transcribe_source
+
+# Initialize FastAPI app
+app = FastAPI()
+telemetry.instrument(app, "stt")
+
+# CORS for allowing requests from orchestrator/frontend
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # change to specific IP/port in production
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Audio config
+SAMPLE_RATE = 16000
+DURATION = 7  # seconds; longest the mic is listened to when no end of speech is detected
+AUDIO_DIR = os.path.realpath(os.getenv("STT_AUDIO_DIR", "audio"))  # /stt/file only reads WAVs under here
+
+# Whisper model (choose base/small for speed), loaded in the background or on first use
+def load_whisper():
+    from faster_whisper import WhisperModel
+    return WhisperModel("base", device="cpu")
+
+def warm_up_whisper(m):
+    segments, _ = m.transcribe(np.zeros(SAMPLE_RATE, dtype="float32"))
+    list(segments)
+
+model = LazyModel("whisper-base", load_whisper, warmup=warm_up_whisper)
+add_lifecycle_routes(app, model)
+
+# Orchestrator endpoint to POST results to
+ORCHESTRATOR_URL = "http://localhost:8000/receive_transcription"
+
+def send_to_orchestrator(transcription: str):
+    response = http_client.get_session().post(ORCHESTRATOR_URL, json={"transcription": transcription}, timeout=300)
+    print(f"📨 Sent to orchestrator, response: {response.status_code}")
+
+def forward_transcript(transcription: str):
+    """send_to_orchestrator for background forwarding, where a failure can only be logged."""
+    try:
+        send_to_orchestrator(transcription)
+    except Exception as e:
+        print(f"❌ Failed to send to orchestrator: {e}")
+
+# background forwards, referenced until done so they are not garbage collected
+_forwards = set()
+
+
+@app.get("/stt")
+def record_and_transcribe():
+    """Listens to the mic until the speaker stops (or DURATION passes) and forwards the transcript."""
+    try:
+        print("🎙️ Listening from mic...")
+        final, _ = transcribe_source(StreamingTranscriber(model.get()), microphone_chunks(DURATION))
+        transcription = final["text"] if final else ""
+
+        print(f"📝 Transcribed: {transcription}")
+
+        # Send transcription to orchestrator
+        send_to_orchestrator(transcription)
+
+        return {"message": "Transcription complete", "sent": True, "transcription": final}
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.get("/stt/file")
+def transcribe_file(path: str, forward: bool = False):
+    """Runs a WAV file under STT_AUDIO_DIR through the streaming pipeline, for testing without a microphone."""
+    full_path = os.path.realpath(os.path.join(AUDIO_DIR, path))
+    if os.path.commonpath([full_path, AUDIO_DIR]) != AUDIO_DIR:
+        raise HTTPException(status_code=403, detail="Audio files must be inside STT_AUDIO_DIR.")
+    try:
+        final, partials = transcribe_source(StreamingTranscriber(model.get()), file_chunks(full_path))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Audio file not found: {path}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if forward and final and final["text"]:
+        send_to_orchestrator(final["text"])
+    return {"final": final, "partials": partials}
+
+
+@app.websocket("/stt/stream")
+async def stream_transcription(websocket: WebSocket, forward: bool = True):
+    """Streaming STT: binary frames of 16 kHz mono int16 PCM in, JSON partial/final events out.
+
+    Send the text message "end" to finalise the current utterance. Each final transcript is
+    forwarded to the orchestrator in the background unless ``?forward=false``.
+    """
+    await websocket.accept()
+    transcriber = StreamingTranscriber(await asyncio.to_thread(model.get))
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                events = await asyncio.to_thread(transcriber.feed, message["bytes"])
+            elif message.get("text") == "end":
+                events = await asyncio.to_thread(transcriber.flush)
+            else:
+                continue
+            for event in events:
+                await websocket.send_json(event)
+                if event["type"] == "final" and forward and event["text"]:
+                    # the orchestrator replies only after the LLM and TTS finish; keep reading audio meanwhile
+                    task = asyncio.create_task(asyncio.to_thread(forward_transcript, event["text"]))
+                    _forwards.add(task)
+                    task.add_done_callback(_forwards.discard)
+    except WebSocketDisconnect:
+        return
+
+# Run this file
+if __name__ == "__main__":
+    uvicorn.run("voice_agent:app", host="0.0.0.0", port=8001, reload=True)